@@ -0,0 +1,333 @@
+"""
+Lectura y escritura de la tabla de variables derivadas, en CSV o en un
+formato columnar (Parquet, Feather o Arrow IPC) con esquema explícito.
+
+El formato 'mmap' (directorio .mmap) guarda cada columna como un fichero
+binario de tipo fijo más un manifest.json. Los lectores proyectan las
+columnas en memoria sin copiarlas, de modo que varios procesos que leen la
+misma tabla comparten una sola copia en la caché de páginas del sistema.
+"""
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# ——————————————————————
+# Esquema de variables_generadas
+# ——————————————————————
+# Indicadores No / Tal vez / Sí (0, 0.5, 1) guardados como códigos int8 (0, 1, 2)
+TRISTATE_COLUMNS = ['Diabetes', 'Hipertension', 'FamHyper', 'FamInfarct']
+BOOL_COLUMNS = ['Sexo_num']
+INT_COLUMNS = ['Edad']
+# Bandas de riesgo de riesgo.py (-1 sin dato, 0 bajo, 1 intermedio, 2 alto)
+CODE_COLUMNS = ['CVD_band', 'CVD_band_bmi']
+# El resto (biomarcadores, frecuencias e índices) se guarda como float32
+
+FORMATS = {
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.feather': 'feather',
+    '.arrow': 'arrow',
+    '.ipc': 'arrow',
+    '.mmap': 'mmap',
+}
+
+# Valor de los códigos enteros sin dato en el formato mmap (no admite nulos)
+MISSING_CODE = -1
+MANIFEST = 'manifest.json'
+MMAP_VERSION = 1
+
+def detect_format(path: str) -> str:
+    ext = os.path.splitext(path.rstrip('/' + os.sep))[1].lower()
+    if ext not in FORMATS:
+        raise ValueError(f"Formato de salida no reconocido para {path} "
+                         f"(extensiones válidas: {', '.join(FORMATS)})")
+    return FORMATS[ext]
+
+def detect_read_format(path: str) -> str:
+    """
+    Formato de una tabla a leer: un directorio con manifest es mmap, las
+    extensiones conocidas mandan y cualquier otra cosa (.txt, .dat, sin
+    extensión) se lee como CSV, igual que con `pd.read_csv`.
+    """
+    if os.path.isdir(path) and os.path.exists(os.path.join(path, MANIFEST)):
+        return 'mmap'
+    ext = os.path.splitext(path.rstrip('/' + os.sep))[1].lower()
+    return FORMATS.get(ext, 'csv')
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+    except ImportError as e:
+        raise ImportError("Los formatos columnares necesitan pyarrow (pip install pyarrow)") from e
+    return pa
+
+def column_dtype(col: str) -> np.dtype:
+    if col in TRISTATE_COLUMNS:
+        return np.dtype(np.int8)
+    if col in BOOL_COLUMNS:
+        return np.dtype(bool)
+    if col in CODE_COLUMNS:
+        return np.dtype(np.int8)
+    if col in INT_COLUMNS:
+        return np.dtype(np.int16)
+    return np.dtype(np.float32)
+
+def column_type(pa, col: str):
+    return pa.from_numpy_dtype(column_dtype(col))
+
+def arrow_schema(columns: list):
+    """Esquema Arrow de las columnas indicadas."""
+    pa = _pyarrow()
+    return pa.schema([pa.field(col, column_type(pa, col)) for col in columns])
+
+def to_arrow_table(df: pd.DataFrame):
+    """Convierte un bloque de variables derivadas a una tabla Arrow con el esquema compacto."""
+    pa = _pyarrow()
+    arrays = []
+    for col in df.columns:
+        values = df[col]
+        if col in TRISTATE_COLUMNS:
+            values = (values * 2).round()
+        elif col in BOOL_COLUMNS:
+            values = values.astype(bool)
+        arrays.append(pa.array(values, type=column_type(pa, col), from_pandas=True, safe=False))
+    return pa.Table.from_arrays(arrays, schema=arrow_schema(list(df.columns)))
+
+def encode_column(col: str, values) -> np.ndarray:
+    """Valores de una columna en el tipo fijo del formato mmap (nulos → MISSING_CODE)."""
+    dtype = column_dtype(col)
+    values = np.asarray(values)
+    if dtype == np.float32:
+        return values.astype(np.float32)
+    if dtype == bool:
+        return values.astype(bool)
+    values = values.astype(float)
+    if col in TRISTATE_COLUMNS:
+        values = np.round(values * 2)
+    return np.where(np.isnan(values), MISSING_CODE, values).astype(dtype)
+
+# ——————————————————————
+# Escritura
+# ——————————————————————
+class ColumnStoreWriter:
+    """
+    Escribe la tabla por bloques como directorio de columnas binarias. Las
+    columnas se escriben en ficheros temporales que sustituyen a los
+    anteriores al cerrar, y el manifest se escribe el último: un lector nunca
+    ve una tabla a medias (mientras se reescribe, el directorio no tiene
+    manifest) y los que ya tenían proyectada la versión anterior la siguen
+    leyendo intacta.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.columns = None
+        self._files = {}
+        self._rows = 0
+        self._old_files = []
+        os.makedirs(path, exist_ok=True)
+        manifest = os.path.join(path, MANIFEST)
+        if os.path.exists(manifest):
+            self._old_files = [e['file'] for e in load_manifest(path)['columns']]
+            os.remove(manifest)
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self.columns is None:
+            for col in df.columns:
+                if not (pd.api.types.is_numeric_dtype(df[col]) or pd.api.types.is_bool_dtype(df[col])):
+                    raise ValueError(f"El formato mmap sólo admite columnas numéricas ('{col}')")
+            self.columns = list(df.columns)
+            self._files = {col: open(os.path.join(self.path, f'{col}.bin.tmp'), 'wb')
+                           for col in self.columns}
+        elif list(df.columns) != self.columns:
+            raise ValueError("Todos los bloques deben tener las mismas columnas")
+        for col in self.columns:
+            self._files[col].write(encode_column(col, df[col]).tobytes())
+        self._rows += len(df)
+
+    def close(self) -> None:
+        if self.columns is None:
+            return
+        for col, f in self._files.items():
+            f.close()
+            os.replace(f.name, os.path.join(self.path, f'{col}.bin'))
+        for name in set(self._old_files) - {f'{col}.bin' for col in self.columns}:
+            try:
+                os.remove(os.path.join(self.path, name))
+            except FileNotFoundError:
+                pass
+        manifest = {
+            'version': MMAP_VERSION,
+            'rows': self._rows,
+            'missing_code': MISSING_CODE,
+            'columns': [{'name': col, 'dtype': column_dtype(col).name, 'file': f'{col}.bin'}
+                        for col in self.columns],
+        }
+        tmp = os.path.join(self.path, MANIFEST + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, os.path.join(self.path, MANIFEST))
+        self.columns = None
+
+class VariablesWriter:
+    """
+    Escribe la tabla por bloques en el formato deducido de la extensión (o
+    `fmt`). En CSV cada bloque se añade al fichero; en Parquet y Arrow cada
+    bloque se escribe como un row group / record batch; en mmap se añade al
+    final de cada fichero de columna.
+    """
+
+    def __init__(self, path: str, fmt: str = None):
+        self.path = path
+        self.fmt = fmt or detect_format(path)
+        self._writer = None
+        self._rows = 0
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self.fmt == 'csv':
+            df.to_csv(self.path, mode='w' if self._rows == 0 else 'a',
+                      header=(self._rows == 0), index=False)
+        elif self.fmt == 'mmap':
+            if self._writer is None:
+                self._writer = ColumnStoreWriter(self.path)
+            self._writer.write(df)
+        else:
+            table = to_arrow_table(df)
+            if self._writer is None:
+                self._writer = self._open(table.schema)
+            self._writer.write_table(table)
+        self._rows += len(df)
+
+    def _open(self, schema):
+        pa = _pyarrow()
+        if self.fmt == 'parquet':
+            import pyarrow.parquet as pq
+            return pq.ParquetWriter(self.path, schema, compression='zstd')
+        # Feather v2 es Arrow IPC en formato fichero; se comprime con lz4
+        compression = 'lz4' if self.fmt == 'feather' else None
+        return pa.ipc.new_file(self.path, schema,
+                               options=pa.ipc.IpcWriteOptions(compression=compression))
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def write_variables(df: pd.DataFrame, path: str, fmt: str = None) -> None:
+    with VariablesWriter(path, fmt) as writer:
+        writer.write(df)
+
+# ——————————————————————
+# Lectura
+# ——————————————————————
+def load_manifest(path: str) -> dict:
+    manifest = os.path.join(path, MANIFEST)
+    if not os.path.exists(manifest):
+        raise FileNotFoundError(f"{path} no es una tabla mmap completa (falta {MANIFEST})")
+    with open(manifest, encoding='utf-8') as f:
+        state = json.load(f)
+    if state.get('version') != MMAP_VERSION:
+        raise ValueError(f"Versión de tabla mmap no soportada: {state.get('version')}")
+    return state
+
+def open_columns(path: str, columns: list = None) -> dict:
+    """
+    Columna → array de numpy proyectado en memoria (sólo lectura) sobre su
+    fichero, con los valores tal como se guardaron (códigos sin decodificar).
+    """
+    state = load_manifest(path)
+    entries = {e['name']: e for e in state['columns']}
+    missing = [c for c in columns or [] if c not in entries]
+    if missing:
+        raise KeyError(f"Columnas no presentes en {path}: {', '.join(missing)}")
+    out = {}
+    for col in columns or list(entries):
+        dtype = np.dtype(entries[col]['dtype'])
+        if state['rows'] == 0:
+            out[col] = np.empty(0, dtype=dtype)
+        else:
+            # Vista ndarray sobre el memmap (pandas no conserva la subclase)
+            out[col] = np.memmap(os.path.join(path, entries[col]['file']), dtype=dtype,
+                                 mode='r', shape=(state['rows'],)).view(np.ndarray)
+    return out
+
+def _mmap_frame(arrays: dict, decode: bool = True) -> pd.DataFrame:
+    # Las columnas float32 (la mayoría) quedan sobre el fichero proyectado; al
+    # decodificar sólo se copian los indicadores y los enteros con huecos
+    if decode:
+        arrays = dict(arrays)
+        for col, values in arrays.items():
+            if values.dtype.kind == 'i' and (col in TRISTATE_COLUMNS or col in INT_COLUMNS):
+                if (values == MISSING_CODE).any():
+                    arrays[col] = np.where(values == MISSING_CODE, np.nan, values)
+    df = pd.DataFrame(arrays, copy=False)
+    return decode_variables(df) if decode else df
+
+def decode_variables(df: pd.DataFrame) -> pd.DataFrame:
+    """Devuelve los indicadores a la escala original (0/0.5/1 y 0/1)."""
+    for col in TRISTATE_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(float) / 2.0
+    for col in BOOL_COLUMNS:
+        if col in df.columns and df[col].dtype == bool:
+            df[col] = df[col].astype(np.int64)
+    return df
+
+def read_variables(path: str, columns: list = None, decode: bool = True) -> pd.DataFrame:
+    """
+    Lee la tabla de variables derivadas. En los formatos columnares sólo se
+    leen las columnas pedidas. Con `decode` los indicadores vuelven a la
+    escala del CSV, de modo que el resultado es intercambiable con él.
+    """
+    fmt = detect_read_format(path)
+    if fmt == 'csv':
+        return pd.read_csv(path, usecols=columns)
+    if fmt == 'mmap':
+        return _mmap_frame(open_columns(path, columns), decode)
+    _pyarrow()
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, columns=columns)
+    else:
+        import pyarrow.feather as feather
+        table = feather.read_table(path, columns=columns, memory_map=True)
+    df = table.to_pandas()
+    return decode_variables(df) if decode else df
+
+def iter_variables(path: str, columns: list = None, chunksize: int = 100_000,
+                   decode: bool = True):
+    """
+    Igual que `read_variables` pero por bloques de como mucho `chunksize`
+    filas, para recorrer tablas que no caben en memoria.
+    """
+    fmt = detect_read_format(path)
+    if fmt == 'csv':
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunksize)
+        return
+    if fmt == 'mmap':
+        arrays = open_columns(path, columns)
+        rows = len(next(iter(arrays.values()))) if arrays else 0
+        for start in range(0, rows, chunksize):
+            yield _mmap_frame({c: a[start:start + chunksize] for c, a in arrays.items()}, decode)
+        return
+    pa = _pyarrow()
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        batches = pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns)
+    else:
+        reader = pa.ipc.open_file(pa.memory_map(path))
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        if columns is not None:
+            batches = (batch.select(columns) for batch in batches)
+    for batch in batches:
+        # Los record batches de Arrow IPC pueden ser mayores que `chunksize`
+        for start in range(0, batch.num_rows, chunksize):
+            df = batch.slice(start, chunksize).to_pandas()
+            yield decode_variables(df) if decode else df
@@ -0,0 +1,246 @@
+"""
+Benchmark por etapas del pipeline a distintos tamaños de datos.
+
+Para cada tamaño se genera una encuesta sintética (sintetico.py) y se mide
+por separado el tiempo (mejor de --repeat ejecuciones) y el pico de memoria
+asignada (tracemalloc, en una ejecución aparte) de cada etapa:
+
+- carga del CSV y parseo de peso/estatura
+- cada mapper de categorías
+- calidad de dieta e índice de hábitos nocivos
+- cada simulador biomédico
+- normalize_data y plot_correlation de formalizacionDatos
+- renderizado de figuras de graficas.py
+
+Los resultados se guardan en JSON y pueden compararse con una ejecución
+anterior (--baseline) marcando las etapas que empeoran más de --threshold.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+import formalizacionDatos
+import generador_variables as gv
+import graficas
+from esquema_encuesta import read_survey
+from sintetico import write_synthetic
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = [1_000, 100_000, 10_000_000]
+
+# Columnas de la encuesta que procesa cada mapper
+MAPPER_COLUMNS = {
+    'map_weekly_freq': (gv.map_weekly_freq, ['activity', 'alcohol', 'satfat', 'sugary', 'salt']),
+    'map_tobacco_consumption': (gv.map_tobacco_consumption, ['tobacco', 'vaping', 'drugs']),
+    'parse_heart_rate': (gv.parse_heart_rate, ['heart_rate']),
+    'map_diet_quality': (gv.map_diet_quality, ['diet_self']),
+    'map_yes_no_maybe': (gv.map_yes_no_maybe, ['diabetes', 'hypertension',
+                                               'fam_hypertension', 'fam_infarct']),
+}
+
+# ——————————————————————
+# Etapas: (nombre, preparación sin medir, ejecución medida)
+# ——————————————————————
+def _load(ctx):
+    df = read_survey(ctx['survey_path'])
+    gv.parse_measure(df['weight'])
+    gv.parse_measure(df['height'])
+
+def _mapper_stage(mapper, columns):
+    def run(ctx):
+        for col in columns:
+            gv.map_categories(ctx['survey'][col], mapper)
+    return run
+
+def _diet_quality(ctx):
+    s = ctx['survey']
+    freq = [gv.map_categories(s[c], gv.map_weekly_freq) for c in ('salt', 'sugary', 'satfat', 'alcohol')]
+    gv.diet_quality_index(gv.map_categories(s['diet_self'], gv.map_diet_quality), *freq)
+
+def _harmful_habits(ctx):
+    s = ctx['survey']
+    gv.harmful_habits_index(*[gv.map_categories(s[c], gv.map_tobacco_consumption)
+                              for c in ('tobacco', 'vaping', 'drugs')])
+
+def _simulator(name):
+    def run(ctx):
+        d, rng = ctx['derived'], np.random.default_rng(0)
+        if name == 'simulate_systolic_bp':
+            gv.simulate_systolic_bp(d['Edad'], d['BMI_norm'], d['Salt_wk'], d['Diet_q'],
+                                    d['Activity_min_wk'], rng)
+        elif name == 'simulate_ldl':
+            gv.simulate_ldl(d['BMI_norm'], d['SatFat_wk'], d['Diet_q'], rng)
+        elif name == 'simulate_hdl':
+            gv.simulate_hdl(d['BMI_norm'], d['Activity_min_wk'], d['Diet_q'], rng)
+        elif name == 'simulate_glucose':
+            gv.simulate_glucose(d['BMI_norm'], d['Sugary_wk'], d['Activity_min_wk'], rng)
+        else:
+            gv.simulate_resting_hr(ctx['hr_base'], d['Stress_pct'], d['Anxiety_pct'],
+                                   d['Activity_min_wk'], rng)
+    return run
+
+def _normalize_data(ctx, frame):
+    formalizacionDatos.normalize_data(frame)
+
+def _plot_correlation(ctx):
+    formalizacionDatos.plot_correlation(ctx['derived'])
+    plt.close('all')
+
+def _render_figures(ctx):
+    # En serie: se mide el coste de dibujo, no el reparto entre procesos
+    graficas.render_all(ctx['derived'], os.path.join(ctx['workdir'], 'docs'), workers=1,
+                        force=True)
+
+def _no_setup(ctx):
+    return ()
+
+def _copy_derived(ctx):
+    return (ctx['derived'].copy(),)
+
+STAGES = [('carga_csv', _no_setup, _load)]
+STAGES += [(name, _no_setup, _mapper_stage(*spec)) for name, spec in MAPPER_COLUMNS.items()]
+STAGES += [
+    ('compute_diet_quality', _no_setup, _diet_quality),
+    ('compute_harmful_habits_index', _no_setup, _harmful_habits),
+]
+STAGES += [(name, _no_setup, _simulator(name)) for name in
+           ('simulate_systolic_bp', 'simulate_ldl', 'simulate_hdl',
+            'simulate_glucose', 'simulate_resting_hr')]
+STAGES += [
+    ('normalize_data', _copy_derived, _normalize_data),
+    ('plot_correlation', _no_setup, _plot_correlation),
+    ('graficas', _no_setup, _render_figures),
+]
+
+def select_stages(names: list = None) -> list:
+    """Etapas de STAGES cuyo nombre está en `names` (todas si no se da)."""
+    if not names:
+        return list(STAGES)
+    unknown = [n for n in names if n not in {s[0] for s in STAGES}]
+    if unknown:
+        raise ValueError(f"Etapas desconocidas: {', '.join(unknown)}")
+    return [s for s in STAGES if s[0] in names]
+
+# ——————————————————————
+# Medición
+# ——————————————————————
+def prepare(size: int, workdir: str, seed: int) -> dict:
+    """Genera la entrada sintética del tamaño pedido y los datos intermedios (sin medir)."""
+    survey_path = os.path.join(workdir, 'encuesta.csv')
+    write_synthetic(os.path.join(HERE, 'encuesta.csv'), survey_path, size, seed)
+    survey = read_survey(survey_path)
+    derived = gv.derive_variables(survey.copy(), gv.make_biomarker_rngs(seed))
+    return {
+        'workdir': workdir,
+        'survey_path': survey_path,
+        'survey': survey,
+        'derived': derived,
+        'hr_base': gv.map_categories(survey['heart_rate'], gv.parse_heart_rate),
+    }
+
+def measure(ctx: dict, setup, run, repeat: int, memory: bool) -> dict:
+    times = []
+    for _ in range(repeat):
+        args = setup(ctx)
+        gc.collect()
+        t0 = time.perf_counter()
+        run(ctx, *args)
+        times.append(time.perf_counter() - t0)
+    result = {'seconds': min(times), 'rows_per_sec': None}
+    if memory:
+        args = setup(ctx)
+        gc.collect()
+        tracemalloc.start()
+        run(ctx, *args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result['peak_mb'] = peak / 2**20
+    return result
+
+def run_benchmark(sizes: list, stages: list = None, repeat: int = 3, memory: bool = True,
+                  seed: int = 0) -> dict:
+    selected = select_stages(stages)
+    results = {name: {} for name, _, _ in selected}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            ctx = prepare(size, workdir, seed)
+            for name, setup, run in selected:
+                res = measure(ctx, setup, run, repeat, memory)
+                res['rows_per_sec'] = size / res['seconds'] if res['seconds'] > 0 else None
+                results[name][str(size)] = res
+                print(f"{name:<30} {size:>10} filas  {res['seconds']:9.4f} s"
+                      + (f"  {res['peak_mb']:9.1f} MB" if memory else ''))
+            del ctx
+    return {
+        'meta': {
+            'date': datetime.now(timezone.utc).isoformat(),
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'repeat': repeat,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """Etapas/tamaños cuyo tiempo supera al de la referencia en más de `threshold` (fracción)."""
+    regressions = []
+    for stage, by_size in current['results'].items():
+        for size, res in by_size.items():
+            ref = baseline.get('results', {}).get(stage, {}).get(size)
+            if ref and ref['seconds'] > 0:
+                ratio = res['seconds'] / ref['seconds']
+                if ratio > 1 + threshold:
+                    regressions.append((stage, size, ref['seconds'], res['seconds'], ratio))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark por etapas del pipeline')
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+                        help='Tamaños en filas separados por comas (admite 1e5)')
+    parser.add_argument('--stages', default=None,
+                        help='Etapas a medir separadas por comas (por defecto, todas)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true', help='No medir el pico de memoria')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--baseline', default=None, help='JSON de una ejecución anterior')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Empeoramiento relativo tolerado frente a la referencia (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    sizes = [int(float(s)) for s in args.sizes.split(',')]
+    stages = args.stages.split(',') if args.stages else None
+    try:
+        select_stages(stages)
+    except ValueError as e:
+        parser.error(str(e))
+    report = run_benchmark(sizes, stages, args.repeat, not args.no_memory, args.seed)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Resultados guardados en {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        for stage, size, before, after, ratio in regressions:
+            print(f"REGRESIÓN {stage} ({size} filas): {before:.4f} s → {after:.4f} s (x{ratio:.2f})")
+        if regressions:
+            sys.exit(1)
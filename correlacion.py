@@ -0,0 +1,93 @@
+"""
+Matriz de correlaciones de Pearson calculada por bloques.
+
+`CorrelationAccumulator` guarda, para cada par de columnas, el número de
+filas en que ambas tienen valor, sus medias, sus sumas de cuadrados
+centradas y su comomento sobre esas filas (NaN por pares, como
+`DataFrame.corr`). Cada bloque se resume con productos de matrices y se
+combina con los acumulados previos por la fórmula de Chan et al., así que
+dos acumuladores de bloques o procesos distintos se pueden fusionar con
+`merge` y el resultado no depende de cómo se partieron los datos.
+"""
+import os
+import numpy as np
+import pandas as pd
+
+class CorrelationAccumulator:
+
+    def __init__(self, columns: list):
+        self.columns = list(columns)
+        p = len(self.columns)
+        self.n = np.zeros((p, p))
+        # mean[i, j], m2[i, j]: media y suma de cuadrados centrada de la
+        # columna i sobre las filas en que i y j tienen valor
+        self.mean = np.zeros((p, p))
+        self.m2 = np.zeros((p, p))
+        self.comoment = np.zeros((p, p))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, columns: list = None) -> 'CorrelationAccumulator':
+        columns = list(df.select_dtypes(include=[np.number]).columns) if columns is None else columns
+        acc = cls(columns)
+        acc.update(df)
+        return acc
+
+    def update(self, df: pd.DataFrame) -> 'CorrelationAccumulator':
+        """Añade un bloque de filas."""
+        x = df[self.columns].to_numpy(dtype=float)
+        valid = ~np.isnan(x)
+        if not valid.any():
+            return self
+        # Se centra el bloque en la media de cada columna para no perder
+        # precisión en las sumas de cuadrados; el desplazamiento se deshace al final
+        x0 = np.where(valid, x, 0.0)
+        shift = x0.sum(axis=0) / np.maximum(valid.sum(axis=0), 1)
+        x0 = np.where(valid, x0 - shift, 0.0)
+        m = valid.astype(float)
+
+        n = m.T @ m
+        s = x0.T @ m                      # s[i, j]: suma de la columna i donde i y j tienen valor
+        q = (x0 ** 2).T @ m
+        cross = x0.T @ x0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(n > 0, s / n, 0.0)
+            m2 = np.where(n > 0, q - s * mean, 0.0)
+            comoment = np.where(n > 0, cross - s * s.T / n, 0.0)
+        block = CorrelationAccumulator(self.columns)
+        block.n, block.mean, block.m2, block.comoment = n, mean + shift[:, None], m2, comoment
+        return self.merge(block)
+
+    def merge(self, other: 'CorrelationAccumulator') -> 'CorrelationAccumulator':
+        """Combina en este acumulador los datos de otro con las mismas columnas."""
+        if other.columns != self.columns:
+            raise ValueError("Sólo se pueden fusionar acumuladores con las mismas columnas")
+        n_a, n_b = self.n, other.n
+        n = n_a + n_b
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frac = np.where(n > 0, n_b / n, 0.0)
+            w = np.where(n > 0, n_a * n_b / n, 0.0)
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * frac
+        self.m2 = self.m2 + other.m2 + delta ** 2 * w
+        self.comoment = self.comoment + other.comoment + delta * delta.T * w
+        self.n = n
+        return self
+
+    def corr(self) -> pd.DataFrame:
+        """Correlaciones de Pearson por pares (NaN si el par tiene menos de 2 filas)."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            r = self.comoment / np.sqrt(self.m2 * self.m2.T)
+        r = np.where(self.n >= 2, np.clip(r, -1.0, 1.0), np.nan)
+        # Diagonal a 1 salvo columnas constantes o casi vacías (NaN, como pandas)
+        np.fill_diagonal(r, np.where((np.diag(self.n) >= 2) & (np.diag(self.m2) > 0), 1.0, np.nan))
+        return pd.DataFrame(r, index=self.columns, columns=self.columns)
+
+    def counts(self) -> pd.DataFrame:
+        """Filas con valor en ambas columnas de cada par."""
+        return pd.DataFrame(self.n.astype(np.int64), index=self.columns, columns=self.columns)
+
+def export_correlation(acc: CorrelationAccumulator, path: str) -> None:
+    """Guarda la matriz de correlaciones como CSV (con el número de filas de cada par en otro CSV)."""
+    acc.corr().to_csv(path)
+    base, ext = os.path.splitext(path)
+    acc.counts().to_csv(f'{base}_n{ext or ".csv"}')
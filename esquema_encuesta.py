@@ -0,0 +1,84 @@
+"""
+Registro único de las preguntas de la encuesta.
+
+Cada pregunta se identifica por una clave corta y un patrón que se busca en
+la cabecera normalizada (minúsculas, espacios colapsados), de modo que las
+pequeñas variaciones entre exportaciones (espacios dobles, espacio final)
+no rompen la lectura. Al cargar se valida la cabecera una sola vez y se
+leen sólo las columnas registradas, ya renombradas a su clave.
+"""
+import re
+import pandas as pd
+
+SURVEY_READ_KW = dict(sep=';', encoding='utf-8-sig')
+
+# clave: (patrón sobre la cabecera normalizada, dtype de lectura)
+# dtype None deja que pandas lo infiera (columnas enteras como la edad)
+SURVEY_SCHEMA = {
+    'timestamp':        (r'^marca temporal', str),
+    'age':              (r'^edad:', None),
+    'sex':              (r'^sexo:', 'category'),
+    'weight':           (r'^rango de peso:', str),
+    'height':           (r'^rango de estatura:', str),
+    'heart_rate':       (r'^frecuencia cardiaca:', 'category'),
+    'diabetes':         (r'^diabetes:', 'category'),
+    'hypertension':     (r'^hipertensión arterial:', 'category'),
+    'fam_hypertension': (r'^historial familiar:.*hipertensión', 'category'),
+    'fam_infarct':      (r'^historial familiar:.*infarto', 'category'),
+    'anxiety':          (r'^ansiedad:', float),
+    'stress':           (r'^estrés:', float),
+    'activity':         (r'^actividad física semanal:', 'category'),
+    'satfat':           (r'^consumo de grasas saturadas:', 'category'),
+    'sugary':           (r'^bebidas azucaradas:', 'category'),
+    'salt':             (r'^uso de sal en la dieta:', 'category'),
+    'diet_self':        (r'^calidad de dieta:', 'category'),
+    'alcohol':          (r'^consumo de alcohol:', 'category'),
+    'tobacco':          (r'^frecuencia de consumo de tabaco:', 'category'),
+    'vaping':           (r'^frecuencia de consumo de cigarrillos electrónicos', 'category'),
+    'drugs':            (r'^frecuencia de consumo de estupefacientes:', 'category'),
+}
+
+def normalize_header(header: str) -> str:
+    return re.sub(r'\s+', ' ', header.replace('\ufeff', '')).strip().lower()
+
+def resolve_columns(headers: list, keys: list = None) -> dict:
+    """
+    Asocia cada clave del registro a su cabecera real. Lanza ValueError si
+    alguna pregunta falta o si su patrón encaja con más de una columna.
+    """
+    keys = list(SURVEY_SCHEMA) if keys is None else keys
+    normalized = [normalize_header(h) for h in headers]
+    mapping, problems = {}, []
+    for key in keys:
+        pattern = re.compile(SURVEY_SCHEMA[key][0])
+        matches = [h for h, n in zip(headers, normalized) if pattern.search(n)]
+        if not matches:
+            problems.append(f"'{key}': ninguna columna encaja con {pattern.pattern!r}")
+        elif len(matches) > 1:
+            problems.append(f"'{key}': varias columnas encajan con {pattern.pattern!r}: {matches}")
+        else:
+            mapping[key] = matches[0]
+    if problems:
+        raise ValueError("La cabecera de la encuesta no coincide con el registro:\n  "
+                         + "\n  ".join(problems))
+    return mapping
+
+def read_header(path: str, **read_kw) -> list:
+    read_kw = {**SURVEY_READ_KW, **read_kw}
+    return list(pd.read_csv(path, nrows=0, **read_kw).columns)
+
+def read_survey(path: str, keys: list = None, chunksize: int = None, **read_kw):
+    """
+    Lee la encuesta proyectando sólo las columnas del registro (o `keys`) y
+    renombrándolas a su clave. Con `chunksize` devuelve un iterador de bloques.
+    """
+    read_kw = {**SURVEY_READ_KW, **read_kw}
+    mapping = resolve_columns(read_header(path, **read_kw), keys)
+    rename = {header: key for key, header in mapping.items()}
+    dtype = {header: SURVEY_SCHEMA[key][1] for key, header in mapping.items()
+             if SURVEY_SCHEMA[key][1] is not None}
+    reader = pd.read_csv(path, usecols=list(mapping.values()), dtype=dtype,
+                         chunksize=chunksize, **read_kw)
+    if chunksize is None:
+        return reader.rename(columns=rename)[list(mapping)]
+    return (chunk.rename(columns=rename)[list(mapping)] for chunk in reader)
@@ -0,0 +1,278 @@
+"""
+Ejecuta el flujo completo reconstruyendo sólo lo que ha cambiado.
+
+    encuesta.csv     → generador_variables.py → variables_generadas.csv → graficas.py → docs/
+    datos_cardio.csv → formalizacionDatos.py  → datos_normalizados.csv
+
+Cada etapa declara su orden, sus ficheros de entrada y de salida; las
+dependencias entre etapas se deducen de qué etapa produce cada entrada. La
+huella de una etapa combina el comando, el contenido de sus entradas y el
+de su código (el script y los módulos locales que importa, directa o
+indirectamente). Si la huella coincide con la de la última ejecución
+correcta y las salidas existen, la etapa se omite.
+
+Las etapas se lanzan como subprocesos (con MPLBACKEND=Agg) en cuanto sus
+dependencias terminan, así que las ramas independientes corren a la vez.
+La salida de cada etapa se muestra al terminar, sin mezclarse con la de
+las demás.
+"""
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = '.estado_etapas.json'
+STATE_VERSION = 1
+
+# ——————————————————————
+# Declaración de etapas
+# ——————————————————————
+STAGES = [
+    {
+        'name': 'variables',
+        'script': 'generador_variables.py',
+        'args': ['--input', 'encuesta.csv', '--output', 'variables_generadas.csv', '--seed', '0'],
+        'inputs': ['encuesta.csv'],
+        'outputs': ['variables_generadas.csv'],
+    },
+    {
+        'name': 'graficas',
+        'script': 'graficas.py',
+        'args': ['--input', 'variables_generadas.csv', '--output-dir', 'docs'],
+        'inputs': ['variables_generadas.csv'],
+        'outputs': ['docs/png'],
+    },
+    {
+        'name': 'normalizacion',
+        'script': 'formalizacionDatos.py',
+        'args': ['--input', 'datos_cardio.csv', '--output', 'datos_normalizados.csv'],
+        'inputs': ['datos_cardio.csv'],
+        'outputs': ['datos_normalizados.csv'],
+    },
+]
+
+def stage_dependencies(stages: list) -> dict:
+    """Etapa → etapas que producen alguna de sus entradas."""
+    producers = {}
+    for st in stages:
+        for out in st['outputs']:
+            producers[os.path.normpath(out)] = st['name']
+    return {st['name']: sorted({producers[os.path.normpath(i)] for i in st['inputs']
+                                if os.path.normpath(i) in producers})
+            for st in stages}
+
+def select_stages(stages: list, targets: list) -> list:
+    """Etapas pedidas más todas las que necesitan, en el orden declarado."""
+    names = {st['name'] for st in stages}
+    unknown = [t for t in targets if t not in names]
+    if unknown:
+        raise ValueError(f"Etapas desconocidas: {', '.join(unknown)}")
+    deps = stage_dependencies(stages)
+    needed, pending = set(), list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in needed:
+            needed.add(name)
+            pending.extend(deps[name])
+    return [st for st in stages if st['name'] in needed]
+
+# ——————————————————————
+# Huellas
+# ——————————————————————
+def local_modules(script: str, root: str = HERE) -> list:
+    """El script y los módulos del proyecto que importa (cierre transitivo)."""
+    seen, pending = [], [os.path.splitext(script)[0]]
+    while pending:
+        name = pending.pop()
+        path = os.path.join(root, f'{name}.py')
+        if name in seen or not os.path.exists(path):
+            continue
+        seen.append(name)
+        with open(path, encoding='utf-8') as f:
+            tree = ast.parse(f.read(), path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                pending.extend(alias.name.split('.')[0] for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                pending.append(node.module.split('.')[0])
+    return sorted(f'{name}.py' for name in seen)
+
+class FileHasher:
+    """
+    Resumen blake2b del contenido de un fichero. Se reutiliza el de la
+    ejecución anterior si tamaño y fecha de modificación no han cambiado,
+    para no releer entradas grandes que siguen igual.
+    """
+
+    def __init__(self, known: dict = None):
+        self.known = dict(known or {})
+
+    def digest(self, path: str) -> str:
+        st = os.stat(path)
+        cached = self.known.get(path)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        self.known[path] = [st.st_size, st.st_mtime_ns, h.hexdigest()]
+        return self.known[path][2]
+
+def stage_fingerprint(stage: dict, hasher: FileHasher, root: str = HERE) -> str:
+    """Huella del comando, las entradas y el código de una etapa."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps([stage['script'], stage['args']]).encode())
+    for path in stage['inputs']:
+        h.update(f"in:{path}:{hasher.digest(os.path.join(root, path))}".encode())
+    for module in local_modules(stage['script'], root):
+        h.update(f"code:{module}:{hasher.digest(os.path.join(root, module))}".encode())
+    return h.hexdigest()
+
+def load_state(path: str) -> dict:
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('version') == STATE_VERSION:
+            return state
+    return {'version': STATE_VERSION, 'stages': {}, 'files': {}}
+
+def save_state(state: dict, path: str) -> None:
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+# ——————————————————————
+# Ejecución
+# ——————————————————————
+def run_stage(stage: dict, root: str = HERE) -> tuple:
+    """Lanza la etapa como subproceso. Devuelve (código de salida, salida, segundos)."""
+    env = dict(os.environ, MPLBACKEND='Agg')
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, stage['script']] + stage['args'], cwd=root, env=env,
+                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    return proc.returncode, proc.stdout, time.perf_counter() - t0
+
+def _report(name: str, message: str, output: str = '') -> None:
+    print(f"[{name}] {message}")
+    for line in output.rstrip().splitlines():
+        print(f"[{name}]   {line}")
+
+def run_pipeline(stages: list = None, targets: list = None, force: bool = False,
+                 jobs: int = None, dry_run: bool = False, root: str = HERE,
+                 state_path: str = None) -> dict:
+    """
+    Ejecuta las etapas pendientes respetando sus dependencias, con hasta
+    `jobs` subprocesos a la vez. Devuelve etapa → estado ('al dia',
+    'ejecutada', 'pendiente' en `dry_run`, 'fallida' o 'bloqueada').
+    """
+    stages = stages or STAGES
+    if targets:
+        stages = select_stages(stages, targets)
+    deps = stage_dependencies(stages)
+    by_name = {st['name']: st for st in stages}
+    state_path = state_path or os.path.join(root, STATE_FILE)
+    state = load_state(state_path)
+    hasher = FileHasher(state['files'])
+    result = {}
+    running = {}            # futuro → etapa
+    fingerprints = {}       # huella de cada etapa lanzada, para guardarla si termina bien
+
+    def _outputs_exist(stage):
+        return all(os.path.exists(os.path.join(root, out)) for out in stage['outputs'])
+
+    def _schedule():
+        """Etapas cuyas dependencias ya terminaron: las al día se resuelven aquí."""
+        ready = []
+        for name, stage in by_name.items():
+            if name in result or name in running.values():
+                continue
+            if any(result.get(d) in ('fallida', 'bloqueada') for d in deps[name]):
+                result[name] = 'bloqueada'
+                _report(name, f"bloqueada: falló {', '.join(deps[name])}")
+                continue
+            if not all(result.get(d) in ('al dia', 'ejecutada', 'pendiente') for d in deps[name]):
+                continue
+            missing = [i for i in stage['inputs'] if not os.path.exists(os.path.join(root, i))]
+            upstream_pending = any(result[d] == 'pendiente' for d in deps[name])
+            if missing and not upstream_pending:
+                result[name] = 'fallida'
+                _report(name, f"faltan entradas: {', '.join(missing)}")
+                continue
+            fp = None if missing else stage_fingerprint(stage, hasher, root)
+            last = state['stages'].get(name, {}).get('fingerprint')
+            if not force and not upstream_pending and fp == last and _outputs_exist(stage):
+                result[name] = 'al dia'
+                _report(name, 'al día')
+            elif dry_run:
+                result[name] = 'pendiente'
+                _report(name, 'se ejecutaría: ' + ' '.join([stage['script']] + stage['args']))
+            else:
+                ready.append((name, fp))
+        return ready
+
+    with ThreadPoolExecutor(max_workers=jobs or len(stages) or 1) as pool:
+        while True:
+            for name, fp in _schedule():
+                _report(name, 'ejecutando: ' + ' '.join([by_name[name]['script']] + by_name[name]['args']))
+                running[pool.submit(run_stage, by_name[name], root)] = name
+                fingerprints[name] = fp
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                code, output, seconds = future.result()
+                if code == 0:
+                    result[name] = 'ejecutada'
+                    state['stages'][name] = {'fingerprint': fingerprints[name],
+                                             'seconds': round(seconds, 3)}
+                    _report(name, f"completada en {seconds:.1f} s", output)
+                else:
+                    result[name] = 'fallida'
+                    state['stages'].pop(name, None)
+                    _report(name, f"falló (código {code}) en {seconds:.1f} s", output)
+                state['files'] = hasher.known
+                save_state(state, state_path)
+    if not dry_run:
+        state['files'] = hasher.known
+        save_state(state, state_path)
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reconstruye las etapas del flujo que han cambiado')
+    parser.add_argument('targets', nargs='*',
+                        help=f"Etapas a reconstruir con sus dependencias "
+                             f"({', '.join(st['name'] for st in STAGES)}; por defecto todas)")
+    parser.add_argument('--force', action='store_true', help='Ejecutar aunque estén al día')
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                        help='Etapas simultáneas como máximo (por defecto, todas las posibles)')
+    parser.add_argument('--dry-run', '-n', action='store_true',
+                        help='Mostrar qué se ejecutaría sin ejecutar nada')
+    parser.add_argument('--list', action='store_true', help='Listar etapas y dependencias')
+    parser.add_argument('--state', default=None,
+                        help=f'Fichero con las huellas de la última ejecución (por defecto {STATE_FILE})')
+    args = parser.parse_args()
+
+    if args.list:
+        deps = stage_dependencies(STAGES)
+        for st in STAGES:
+            after = f" (tras {', '.join(deps[st['name']])})" if deps[st['name']] else ''
+            print(f"{st['name']}{after}: {', '.join(st['inputs'])} → {', '.join(st['outputs'])}")
+            print(f"    código: {', '.join(local_modules(st['script']))}")
+        raise SystemExit(0)
+    try:
+        select_stages(STAGES, args.targets)
+    except ValueError as e:
+        parser.error(str(e))
+    result = run_pipeline(targets=args.targets, force=args.force, jobs=args.jobs,
+                          dry_run=args.dry_run, state_path=args.state)
+    raise SystemExit(1 if any(r in ('fallida', 'bloqueada') for r in result.values()) else 0)
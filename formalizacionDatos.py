@@ -1,36 +1,46 @@
+import argparse
+import json
+import os
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import MinMaxScaler, StandardScaler
 import matplotlib.pyplot as plt
 
+import instrumentacion
+from almacenamiento import iter_variables, read_variables
+from correlacion import CorrelationAccumulator, export_correlation
+from instrumentacion import instrument
+
 # 1. Cargar datos
 def load_data(path):
-    df = pd.read_csv(path)
+    # CSV o cualquier formato de almacenamiento (un directorio .mmap se proyecta sin copiar)
+    df = read_variables(path)
     return df
 
 # 2. Generar variables derivadas si no están presentes
 def derive_lifestyle_variables(df):
+    # Sirve igual para un DataFrame que para un registro suelto (dict)
     # Índice de Masa Corporal (IMC) si existe peso y altura
-    if 'Peso_kg' in df.columns and 'Altura_m' in df.columns:
+    if 'Peso_kg' in df and 'Altura_m' in df:
         df['IMC'] = df['Peso_kg'] / (df['Altura_m'] ** 2)
     # Actividad física: ejemplo de MET-minutos semanales
-    if 'Minutos_actividad_semanal' in df.columns:
+    if 'Minutos_actividad_semanal' in df:
         df['Actividad_Fisica'] = df['Minutos_actividad_semanal'] / 150  # Normalizar vs recomendación WHO
     # Calidad de la dieta: suponga un puntaje 0-100
-    if 'Puntaje_dieta' in df.columns:
+    if 'Puntaje_dieta' in df:
         df['Calidad_Dieta'] = df['Puntaje_dieta'] / 100
     # Tabaquismo: índice de paquetes-año
-    if 'Cigarrillos_por_dia' in df.columns and 'Anios_fumando' in df.columns:
+    if 'Cigarrillos_por_dia' in df and 'Anios_fumando' in df:
         df['Tabaquismo'] = (df['Cigarrillos_por_dia'] / 20) * df['Anios_fumando']
     # Consumo de alcohol: unidades estándar por semana
-    if 'Copas_por_semana' in df.columns:
+    if 'Copas_por_semana' in df:
         df['Consumo_Alcohol'] = df['Copas_por_semana'] / 14  # Definición de consumo moderado
     # Nivel de estrés: escala 1-10
-    if 'Escala_estres' in df.columns:
+    if 'Escala_estres' in df:
         df['Estres'] = df['Escala_estres'] / 10
     # Ansiedad y Depresión: asuma escala 0-21 (GAD-7, PHQ-9)
     for col, max_score in [('Ansiedad', 21), ('Depresion', 27)]:
-        if col in df.columns:
+        if col in df:
             df[col] = df[col] / max_score
     return df
 
@@ -55,6 +65,133 @@ def normalize_data(df, method='minmax'):
     # Dejar variables categóricas sin cambios (Sexo, etc.)
     return df, scaler
 
+# 4b. Normalización por bloques (fuera de memoria)
+
+def _scaler(method):
+    return MinMaxScaler() if method=='minmax' else StandardScaler()
+
+def prepare_chunk(chunk):
+    """Variables derivadas y selección de un bloque, igual que en `preprocess`."""
+    return select_variables(derive_lifestyle_variables(chunk))
+
+def fit_scaler_streaming(path, method='minmax', chunksize=100_000):
+    """
+    Ajusta el escalador con `partial_fit` recorriendo el CSV por bloques.
+    Las columnas numéricas se fijan con el primer bloque. Devuelve
+    (escalador, columnas numéricas).
+    """
+    scaler, numeric = _scaler(method), None
+    for chunk in iter_variables(path, chunksize=chunksize):
+        with instrument.stage('ajuste', rows=len(chunk)):
+            df = prepare_chunk(chunk)
+            if numeric is None:
+                numeric = list(df.select_dtypes(include=[np.number]).columns)
+            scaler.partial_fit(df[numeric])
+    return scaler, numeric
+
+def transform_streaming(path, out_path, scaler, numeric, chunksize=100_000, corr=None):
+    """
+    Segunda pasada: normaliza cada bloque con el escalador ya ajustado y lo
+    añade a `out_path`. Si se pasa un `CorrelationAccumulator` en `corr`,
+    también se acumulan en él los bloques normalizados.
+    """
+    rows = 0
+    for chunk in iter_variables(path, chunksize=chunksize):
+        with instrument.stage('normalizacion', rows=len(chunk)):
+            df = prepare_chunk(chunk)
+            df[numeric] = scaler.transform(df[numeric])
+        if corr is not None:
+            with instrument.stage('correlacion', rows=len(df)):
+                corr.update(df)
+        with instrument.stage('escritura', rows=len(df)):
+            df.to_csv(out_path, mode='w' if rows == 0 else 'a', header=(rows == 0), index=False)
+        rows += len(df)
+    return rows
+
+def preprocess_streaming(path, out_path, method='minmax', chunksize=100_000):
+    """
+    Versión de `preprocess` con memoria acotada: dos pasadas por bloques
+    (ajuste y transformación) sin cargar el fichero entero. Las
+    correlaciones se acumulan durante la segunda pasada; las distribuciones
+    no se dibujan. Devuelve (escalador, acumulador de correlaciones).
+    """
+    scaler, numeric = fit_scaler_streaming(path, method, chunksize)
+    if numeric is None:
+        raise ValueError(f"{path} no tiene filas")
+    corr = CorrelationAccumulator(numeric)
+    transform_streaming(path, out_path, scaler, numeric, chunksize, corr)
+    return scaler, corr
+
+# 4c. Escalador persistido y transformación sin reajuste
+
+SCALER_VERSION = 1
+
+def scaler_state(scaler, columns, method):
+    """
+    Estado congelado del escalador: columnas seleccionadas, columnas
+    numéricas y la transformación afín x * scale + offset de cada una.
+    """
+    numeric = list(scaler.feature_names_in_)
+    if method == 'minmax':
+        scale, offset = scaler.scale_, scaler.min_
+    else:
+        scale = 1.0 / scaler.scale_
+        offset = -scaler.mean_ * scale
+    return {
+        'version': SCALER_VERSION,
+        'method': method,
+        'columns': list(columns),
+        'numeric': numeric,
+        'scale': [float(v) for v in scale],
+        'offset': [float(v) for v in offset],
+        'n_samples': int(np.max(scaler.n_samples_seen_)),
+    }
+
+def save_scaler(path, state):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+def load_scaler(path):
+    with open(path, encoding='utf-8') as f:
+        state = json.load(f)
+    if state.get('version') != SCALER_VERSION:
+        raise ValueError(f"{path}: versión de escalador {state.get('version')} no soportada "
+                         f"(se esperaba {SCALER_VERSION})")
+    # Vectores para lotes y pares (columna, escala, desplazamiento) para registros sueltos
+    state['_scale'] = np.array(state['scale'])
+    state['_offset'] = np.array(state['offset'])
+    state['_affine'] = list(zip(state['numeric'], state['scale'], state['offset']))
+    return state
+
+def transform_batch(state, df):
+    """Normaliza un lote nuevo con el escalador guardado, sin reajustarlo."""
+    df = derive_lifestyle_variables(df).reindex(columns=state['columns'])
+    numeric = state['numeric']
+    df[numeric] = df[numeric].to_numpy(dtype=float) * state['_scale'] + state['_offset']
+    return df
+
+def transform_record(state, record):
+    """Normaliza un único registro (dict) sin pasar por pandas."""
+    record = derive_lifestyle_variables(dict(record))
+    out = {c: record.get(c, np.nan) for c in state['columns']}
+    for col, scale, offset in state['_affine']:
+        value = out[col]
+        out[col] = np.nan if value is None else float(value) * scale + offset
+    return out
+
+def transform_streaming_frozen(path, out_path, state, chunksize=100_000):
+    """Aplica `transform_batch` a un CSV por bloques."""
+    rows = 0
+    for chunk in iter_variables(path, chunksize=chunksize):
+        with instrument.stage('normalizacion', rows=len(chunk)):
+            df = transform_batch(state, chunk)
+        with instrument.stage('escritura', rows=len(df)):
+            df.to_csv(out_path, mode='w' if rows == 0 else 'a', header=(rows == 0), index=False)
+        rows += len(df)
+    return rows
+
 # 5. Graficar distribuciones
 
 def plot_distributions(df):
@@ -72,8 +209,11 @@ def plot_distributions(df):
 
 # 6. Correlation heatmap
 
-def plot_correlation(df):
-    corr = df.select_dtypes(include=[np.number]).corr()
+def plot_correlation(data):
+    # `data` puede ser un DataFrame o un CorrelationAccumulator ya acumulado
+    if not isinstance(data, CorrelationAccumulator):
+        data = CorrelationAccumulator.from_frame(data)
+    corr = data.corr()
     plt.figure(figsize=(10,8))
     plt.imshow(corr, vmin=-1, vmax=1)
     plt.colorbar()
@@ -84,17 +224,62 @@ def plot_correlation(df):
     plt.show()
 
 # Función principal
-def preprocess(path):
-    df = load_data(path)
-    df = derive_lifestyle_variables(df)
-    df_sel = select_variables(df)
-    df_norm, scaler = normalize_data(df_sel)
-    plot_distributions(df_norm)
-    plot_correlation(df_norm)
+def preprocess(path, method='minmax'):
+    with instrument.stage('carga'):
+        df = load_data(path)
+    n = len(df)
+    with instrument.stage('variables_derivadas', rows=n):
+        df = derive_lifestyle_variables(df)
+    with instrument.stage('seleccion', rows=n):
+        df_sel = select_variables(df)
+    with instrument.stage('normalizacion', rows=n):
+        df_norm, scaler = normalize_data(df_sel, method)
+    with instrument.stage('distribuciones', rows=n):
+        plot_distributions(df_norm)
+    with instrument.stage('correlacion', rows=n):
+        plot_correlation(df_norm)
     return df_norm, scaler
 
 if __name__ == '__main__':
-    ruta = 'datos_cardio.csv'
-    df_normalizado, scaler_usado = preprocess(ruta)
-    df_normalizado.to_csv('datos_normalizados.csv', index=False)
+    parser = argparse.ArgumentParser(description='Normaliza los datos cardiovasculares')
+    parser.add_argument('--input', default='datos_cardio.csv')
+    parser.add_argument('--output', default='datos_normalizados.csv')
+    parser.add_argument('--method', choices=['minmax', 'standard'], default='minmax')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='Procesar por bloques de este tamaño con memoria acotada '
+                             '(sólo el mapa de correlaciones)')
+    parser.add_argument('--corr-output', default=None,
+                        help='Guardar también la matriz de correlaciones en este CSV')
+    parser.add_argument('--save-scaler', default=None,
+                        help='Guardar el escalador ajustado y las columnas seleccionadas en este JSON')
+    parser.add_argument('--scaler', default=None,
+                        help='Sólo transformar con este escalador guardado (sin reajuste ni gráficas)')
+    instrumentacion.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentacion.configure_from_args(args)
+
+    if args.scaler:
+        transform_streaming_frozen(args.input, args.output, load_scaler(args.scaler),
+                                   args.chunksize or 100_000)
+        print("Normalización con el escalador guardado completada.")
+        instrumentacion.finish_from_args(args)
+        raise SystemExit(0)
+
+    if args.chunksize:
+        scaler_usado, corr = preprocess_streaming(args.input, args.output, args.method,
+                                                  args.chunksize)
+        columnas = list(pd.read_csv(args.output, nrows=0).columns)
+        plot_correlation(corr)
+    else:
+        df_normalizado, scaler_usado = preprocess(args.input, args.method)
+        columnas = list(df_normalizado.columns)
+        with instrument.stage('escritura', rows=len(df_normalizado)):
+            df_normalizado.to_csv(args.output, index=False)
+        if args.corr_output:
+            corr = CorrelationAccumulator.from_frame(df_normalizado)
+    if args.corr_output:
+        export_correlation(corr, args.corr_output)
+    if args.save_scaler:
+        save_scaler(args.save_scaler, scaler_state(scaler_usado, columnas, args.method))
     print("Preprocesamiento y normalización completados.")
+    instrumentacion.finish_from_args(args)
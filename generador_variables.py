@@ -1,11 +1,22 @@
+import argparse
+import glob
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
 import re
 
+from almacenamiento import VariablesWriter, detect_format, write_variables
+from esquema_encuesta import read_survey
+from instrumentacion import instrument
+import instrumentacion
+
 # ——————————————————————
 # Mapping functions para categorías de la encuesta
 # ——————————————————————
-def map_weekly_freq(cat: str) -> float:
+def map_weekly_freq(cat: str, default: float = 0.0) -> float:
     if pd.isna(cat): return 0.0
     cat = cat.lower()
     if 'nunca' in cat: return 0.0
@@ -18,9 +29,9 @@ def map_weekly_freq(cat: str) -> float:
     nums = re.findall(r"(\d+)", cat)
     if nums:
         return float(nums[0])
-    return 0.0
+    return default
 
-def map_tobacco_consumption(cat: str) -> float:
+def map_tobacco_consumption(cat: str, default: float = 0.0) -> float:
     """
     Mapea categorías de consumo de tabaco a un valor numérico de 0 a 1
     0 = No consume
@@ -31,7 +42,7 @@ def map_tobacco_consumption(cat: str) -> float:
     """
     if pd.isna(cat): return 0.0
     cat = cat.lower()
-    if 'nunca' in cat: return 0.0
+    if 'nunca' in cat or 'nada' in cat: return 0.0
     if 'casi nunca' in cat: return 0.1
     if 'cada día' in cat and 'menos de 5' in cat: return 0.75
     if 'cada día' in cat and '5 o más' in cat: return 1.0
@@ -39,11 +50,12 @@ def map_tobacco_consumption(cat: str) -> float:
     if '3-4' in cat: return 0.75
     # Para cualquier otro caso que indique consumo frecuente
     if 'diario' in cat or 'a diario' in cat: return 0.9
-    return 0.0
+    return default
 
-def parse_heart_rate(cat: str) -> float:
+def parse_heart_rate(cat: str, default: float = np.nan) -> float:
     if pd.isna(cat): return np.nan
     cat = cat.lower()
+    if 'no lo s' in cat: return np.nan
     if 'menor a 60' in cat: return 55.0
     if 'entre 60' in cat and '70' in cat: return 65.0
     if 'entre 70' in cat and '80' in cat: return 75.0
@@ -51,22 +63,58 @@ def parse_heart_rate(cat: str) -> float:
     nums = re.findall(r"(\d+)", cat)
     if len(nums) >= 2:
         return (float(nums[0]) + float(nums[1])) / 2
-    return np.nan
+    return default
 
-def map_diet_quality(cat: str) -> float:
+def map_diet_quality(cat: str, default: float = 0.5) -> float:
     if pd.isna(cat): return 0.5
     cat = cat.lower()
     if 'saludable' in cat: return 1.0
     if 'moderada' in cat: return 0.5
     if 'pobre' in cat: return 0.0
-    return 0.5
+    return default
 
-def map_yes_no_maybe(cat: str) -> float:
+def map_yes_no_maybe(cat: str, default: float = 0.0) -> float:
     if pd.isna(cat): return 0.0
     cat = cat.lower()
     if 'sí' in cat: return 1.0
     if 'tal vez' in cat or 'quizá' in cat: return 0.5
-    return 0.0
+    if cat.strip().startswith('no'): return 0.0
+    return default
+
+# ——————————————————————
+# Motor de mapeo por categorías únicas
+# ——————————————————————
+_NO_MATCH = object()
+
+def map_categories(series: pd.Series, mapper, unrecognized: dict = None) -> pd.Series:
+    """
+    Aplica `mapper` a una columna de respuestas evaluando cada respuesta
+    distinta una sola vez: factoriza la columna, resuelve las categorías
+    únicas con las reglas del mapper y expande el resultado por código.
+    Da los mismos valores que `series.map(mapper)`.
+
+    Si se pasa `unrecognized`, las respuestas que no encajan en ninguna regla
+    del mapper (y que reciben su valor por defecto) se añaden a
+    `unrecognized[series.name]`.
+    """
+    codes, uniques = pd.factorize(series)
+    # La última posición de la tabla corresponde a los NaN (código -1)
+    table = np.empty(len(uniques) + 1, dtype=float)
+    for i, cat in enumerate(uniques):
+        val = mapper(cat, default=_NO_MATCH)
+        if val is _NO_MATCH:
+            if unrecognized is not None:
+                unrecognized.setdefault(series.name, set()).add(cat)
+            val = mapper(cat)
+        table[i] = val
+    table[-1] = mapper(np.nan)
+    return pd.Series(table[codes], index=series.index, name=series.name)
+
+def report_unrecognized(unrecognized: dict) -> None:
+    """Imprime las respuestas no reconocidas agrupadas por columna."""
+    for col, cats in unrecognized.items():
+        if cats:
+            print(f"Respuestas no reconocidas en '{col}': {sorted(cats)}")
 
 # ——————————————————————
 # Cálculos biomédicos
@@ -75,57 +123,120 @@ def compute_bmi(weight: float, height_cm: float) -> float:
     h = height_cm / 100.0
     return weight / (h * h) if h > 0 else np.nan
 
-def normalize_bmi_series(bmi_series: pd.Series) -> pd.Series:
-    mi, ma = bmi_series.min(), bmi_series.max()
+def bmi_from_measures(weight, height_cm):
+    """Versión vectorizada de `compute_bmi` (NaN si la estatura no es positiva)."""
+    h = np.asarray(height_cm, dtype=float) / 100.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(h > 0, np.asarray(weight, dtype=float) / (h * h), np.nan)
+
+def normalize_bmi_series(bmi_series: pd.Series, bounds: tuple = None) -> pd.Series:
+    # `bounds` permite normalizar un bloque con el mínimo/máximo de todo el conjunto
+    mi, ma = bounds if bounds is not None else (bmi_series.min(), bmi_series.max())
     return (bmi_series - mi) / (ma - mi)
 
-def compute_systolic_bp(age: float, bmi_norm: float, salt_wk: float,
-                        diet_q: float, activity_min: float) -> float:
+# Generadores independientes por biomarcador: cada columna consume siempre
+# su propio flujo, de modo que el resultado no depende del orden de cálculo
+BIOMARKERS = ['BP_systolic', 'LDL', 'HDL', 'Glucemia', 'HR_rest']
+
+def make_biomarker_rngs(seed=None) -> dict:
+    """
+    Crea un `numpy.random.Generator` por biomarcador a partir de una semilla
+    raíz (entero o `numpy.random.SeedSequence`).
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    children = seed.spawn(len(BIOMARKERS))
+    return {name: np.random.default_rng(ss) for name, ss in zip(BIOMARKERS, children)}
+
+def _normal_noise(rng, scale: float, shape):
+    # Sin generador inyectado se usa el RNG global de numpy (comportamiento original)
+    if rng is None:
+        return np.random.normal(0, scale, shape)
+    return rng.normal(0, scale, shape)
+
+def _add_noise(val, rng, scale: float, replicates: int = None):
+    # Con `replicates` = K se sacan K realizaciones por fila en una sola
+    # llamada: el resultado tiene una dimensión más (filas × K)
+    if replicates is None:
+        return val + _normal_noise(rng, scale, np.shape(val))
+    val = np.asarray(val, dtype=float)[..., None]
+    return val + _normal_noise(rng, scale, val.shape[:-1] + (replicates,))
+
+# Versiones vectorizadas: reciben arrays y sacan todo el ruido de la
+# columna en una sola llamada al generador
+def simulate_systolic_bp(age, bmi_norm, salt_wk, diet_q, activity_min, rng=None, replicates=None):
     base = 110.0
-    val = base + age * 0.5 + bmi_norm * 15 - activity_min / 200 + salt_wk * 2 + (1 - diet_q) * 5
-    return val + np.random.normal(0, 5)
+    val = base + np.asarray(age) * 0.5 + np.asarray(bmi_norm) * 15 - np.asarray(activity_min) / 200 \
+        + np.asarray(salt_wk) * 2 + (1 - np.asarray(diet_q)) * 5
+    return _add_noise(val, rng, 5, replicates)
 
-def compute_ldl(bmi_norm: float, satfat_wk: float, diet_q: float) -> float:
+def simulate_ldl(bmi_norm, satfat_wk, diet_q, rng=None, replicates=None):
     base = 100.0
-    val = base + bmi_norm * 20 + satfat_wk * 5 + (1 - diet_q) * 10
-    return val + np.random.normal(0, 10)
+    val = base + np.asarray(bmi_norm) * 20 + np.asarray(satfat_wk) * 5 + (1 - np.asarray(diet_q)) * 10
+    return _add_noise(val, rng, 10, replicates)
 
-def compute_hdl(bmi_norm: float, activity_min: float, diet_q: float) -> float:
+def simulate_hdl(bmi_norm, activity_min, diet_q, rng=None, replicates=None):
     base = 50.0
-    val = base - bmi_norm * 10 + activity_min / 200 + diet_q * 5
-    return val + np.random.normal(0, 5)
+    val = base - np.asarray(bmi_norm) * 10 + np.asarray(activity_min) / 200 + np.asarray(diet_q) * 5
+    return _add_noise(val, rng, 5, replicates)
 
-def compute_glucose(bmi_norm: float, sugary_wk: float, activity_min: float) -> float:
+def simulate_glucose(bmi_norm, sugary_wk, activity_min, rng=None, replicates=None):
     base = 90.0
-    val = base + bmi_norm * 20 + sugary_wk * 2 - activity_min / 120
-    return val + np.random.normal(0, 5)
+    val = base + np.asarray(bmi_norm) * 20 + np.asarray(sugary_wk) * 2 - np.asarray(activity_min) / 120
+    return _add_noise(val, rng, 5, replicates)
+
+def simulate_resting_hr(parsed_hr, stress_pct, anxiety_pct, activity_min, rng=None, replicates=None):
+    val = np.asarray(parsed_hr) + np.asarray(stress_pct) * 0.1 + np.asarray(anxiety_pct) * 0.05 \
+        - np.asarray(activity_min) / 100
+    return _add_noise(val, rng, 3, replicates)
+
+# Peso de BMI_norm en cada biomarcador: permite corregir filas ya generadas
+# cuando cambian los extremos del IMC sin volver a sacar el ruido
+BMI_NORM_COEFS = {'BP_systolic': 15, 'LDL': 20, 'HDL': -10, 'Glucemia': 20, 'Blood_sugar': 20}
+
+# Versiones escalares (un respondiente)
+def compute_systolic_bp(age: float, bmi_norm: float, salt_wk: float,
+                        diet_q: float, activity_min: float, rng=None) -> float:
+    return float(simulate_systolic_bp(age, bmi_norm, salt_wk, diet_q, activity_min, rng))
+
+def compute_ldl(bmi_norm: float, satfat_wk: float, diet_q: float, rng=None) -> float:
+    return float(simulate_ldl(bmi_norm, satfat_wk, diet_q, rng))
+
+def compute_hdl(bmi_norm: float, activity_min: float, diet_q: float, rng=None) -> float:
+    return float(simulate_hdl(bmi_norm, activity_min, diet_q, rng))
+
+def compute_glucose(bmi_norm: float, sugary_wk: float, activity_min: float, rng=None) -> float:
+    return float(simulate_glucose(bmi_norm, sugary_wk, activity_min, rng))
 
 def compute_resting_hr(parsed_hr: float, stress_pct: float,
-                       anxiety_pct: float, activity_min: float) -> float:
-    val = parsed_hr + stress_pct * 0.1 + anxiety_pct * 0.05 - activity_min / 100
-    return val + np.random.normal(0, 3)
+                       anxiety_pct: float, activity_min: float, rng=None) -> float:
+    return float(simulate_resting_hr(parsed_hr, stress_pct, anxiety_pct, activity_min, rng))
 
 # ——————————————————————
 # Cálculo combinado de calidad de dieta
 # ——————————————————————
+# Pesos de los índices compuestos (sensibilidad.py explora alternativas)
+# Calidad de dieta: auto-evaluación, frecuencias de consumos no saludables
+DIET_Q_WEIGHTS = (0.3, 0.7)
+# Hábitos nocivos: tabaco, vapeo, estupefacientes
+HARMFUL_WEIGHTS = (0.5, 0.2, 0.3)
+
 def compute_diet_quality(row: pd.Series) -> float:
+    # `row` usa las claves del registro de esquema_encuesta (ver read_survey)
     # 1) Auto-evaluación subjetiva
-    self_q = map_diet_quality(
-        row['Calidad de dieta: ¿Cómo calificaría la calidad de su alimentación?']
-    )
+    self_q = map_diet_quality(row['diet_self'])
     # 2) Frecuencias semanales de consumos "no saludables"
-    salt    = map_weekly_freq(
-        row['Uso de sal en la dieta: ¿Con qué frecuencia usa sal de adición para las comidas o ingiere snacks salados?']
-    )
-    sugary  = map_weekly_freq(
-        row['Bebidas azucaradas: ¿Cuántas veces por semana consume refrescos, jugos envasados o bebidas energéticas azucaradas?']
-    )
-    satfat  = map_weekly_freq(
-        row['Consumo de grasas saturadas: ¿Con qué frecuencia consume alimentos ricos en grasas saturadas (hamburguesas, patatas fritas, carnes rojas con grasa, quesos curados, etc.)?']
-    )
-    alcohol = map_weekly_freq(
-        row['Consumo de alcohol: ¿Con qué frecuencia consume bebidas alcohólicas (cerveza, vino, licores)?']
-    )
+    salt    = map_weekly_freq(row['salt'])
+    sugary  = map_weekly_freq(row['sugary'])
+    satfat  = map_weekly_freq(row['satfat'])
+    alcohol = map_weekly_freq(row['alcohol'])
+    return float(diet_quality_index(self_q, salt, sugary, satfat, alcohol))
+
+def diet_quality_index(self_q, salt, sugary, satfat, alcohol):
+    """
+    Combina la auto-evaluación y las frecuencias semanales de consumos no
+    saludables en el índice de calidad de dieta. Acepta escalares o arrays.
+    """
     # 3) Normalizar a [0,1] dividiendo por 7
     max_freq = 7.0
     salt_n    = np.clip(salt    / max_freq, 0, 1)
@@ -133,10 +244,11 @@ def compute_diet_quality(row: pd.Series) -> float:
     satfat_n  = np.clip(satfat  / max_freq, 0, 1)
     alcohol_n = np.clip(alcohol / max_freq, 0, 1)
     # 4) Índice hábitos no saludables
-    unhealthy = np.mean([salt_n, sugary_n, satfat_n, alcohol_n])
+    unhealthy = (salt_n + sugary_n + satfat_n + alcohol_n) / 4
     # 5) Combinar subjetivo y objetivo
-    diet_q = 0.3 * self_q + 0.7 * (1 - unhealthy)
-    return float(np.clip(diet_q, 0, 1))
+    w_self, w_habits = DIET_Q_WEIGHTS
+    diet_q = w_self * self_q + w_habits * (1 - unhealthy)
+    return np.clip(diet_q, 0, 1)
 
 # ——————————————————————
 # Cálculo combinado de hábitos nocivos
@@ -149,128 +261,407 @@ def compute_harmful_habits_index(row: pd.Series) -> float:
     3. Consumo de estupefacientes
     
     Retorna un valor entre 0 (sin hábitos nocivos) y 1 (máximo de hábitos nocivos)
+    `row` usa las claves del registro de esquema_encuesta (ver read_survey).
     """
     # 1) Consumo de tabaco (mayor peso: 50%)
-    tobacco = map_tobacco_consumption(
-        row['Frecuencia de consumo de tabaco: ¿Con qué frecuencia consume tabaco (cigarros, puros, etc.)?']
-    )
+    tobacco = map_tobacco_consumption(row['tobacco'])
     
     # 2) Consumo de cigarrillos electrónicos/vapeo (peso: 30%)
-    vaping = map_tobacco_consumption(
-        row['Frecuencia de consumo de cigarrillos electrónicos o cachimba : ¿Con qué frecuencia utiliza dispositivos como cigarrillos electrónicos o cachimba?']
-    )
+    vaping = map_tobacco_consumption(row['vaping'])
     
     # 3) Consumo de estupefacientes (peso: 20%)
-    drugs = map_tobacco_consumption(
-        row['Frecuencia de consumo de estupefacientes: ¿Con qué frecuencia consume sustancias psicoactivas?']
-    )
+    drugs = map_tobacco_consumption(row['drugs'])
     
+    return float(harmful_habits_index(tobacco, vaping, drugs))
+
+def harmful_habits_index(tobacco, vaping, drugs):
+    """Combinación ponderada de los componentes. Acepta escalares o arrays."""
     # 4) Combinación ponderada
-    harmful_index = 0.5 * tobacco + 0.2 * vaping + 0.3 * drugs
-    
-    return float(np.clip(harmful_index, 0, 1))
+    w_tobacco, w_vaping, w_drugs = HARMFUL_WEIGHTS
+    harmful_index = w_tobacco * tobacco + w_vaping * vaping + w_drugs * drugs
+    return np.clip(harmful_index, 0, 1)
 
 
-if __name__ == '__main__':
-    # 1) Carga y limpieza básica
-    df = pd.read_csv('encuesta.csv', sep=';', encoding='utf-8-sig')
-    df['Peso'] = (
-        df['Rango de peso: ¿Cuál es su peso actual en kg? (solo el numero, sin decimales)']
-        .astype(str).str.replace(',', '.')
-        .replace({'-': np.nan, '': np.nan})
-        .astype(float)
-    )
-    df['Estatura'] = (
-        df['Rango de estatura: ¿Cuál es su estatura actual en cm? (solo el numero, sin comas son cm)']
-        .astype(str).str.replace(',', '.')
+# ——————————————————————
+# Pipeline encuesta.csv → variables_generadas.csv
+# ——————————————————————
+OUTPUT_COLUMNS = [
+    'Edad','Sexo_num','Diabetes','Hipertension','BMI','BMI_norm',
+    'BP_systolic','LDL','HDL','Glucemia','Blood_sugar','HR_rest',
+    'FamHyper','FamInfarct','Stress_pct','Anxiety_pct',
+    'Activity_min_wk','Alcohol_wk','Diet_q','SatFat_wk','Sugary_wk','Salt_wk',
+    'Harmful_habits','Tobacco','Vaping','Drugs'
+]
+
+# Mapper de cada pregunta categórica (claves del registro de esquema_encuesta)
+FIELD_MAPPERS = {
+    'diabetes': map_yes_no_maybe,
+    'hypertension': map_yes_no_maybe,
+    'fam_hypertension': map_yes_no_maybe,
+    'fam_infarct': map_yes_no_maybe,
+    'activity': map_weekly_freq,
+    'alcohol': map_weekly_freq,
+    'satfat': map_weekly_freq,
+    'sugary': map_weekly_freq,
+    'salt': map_weekly_freq,
+    'diet_self': map_diet_quality,
+    'tobacco': map_tobacco_consumption,
+    'vaping': map_tobacco_consumption,
+    'drugs': map_tobacco_consumption,
+    'heart_rate': parse_heart_rate,
+}
+
+def parse_measure(series: pd.Series) -> pd.Series:
+    """Convierte una respuesta numérica libre (peso, estatura) a float."""
+    return (
+        series.astype(str).str.replace(',', '.')
         .replace({'-': np.nan, '': np.nan})
         .astype(float)
     )
-    df['Edad'] = df['Edad:']
-    df['Sexo_num'] = df['Sexo:'].map({'Masculino': 1, 'Femenino': 0}).fillna(0)
-    df['Diabetes'] = df['Diabetes: ¿Padece de diabetes?'].map(map_yes_no_maybe)
-    df['Hipertension'] = df[
-        'Hipertensión arterial: ¿Padece o ha padecido hipertensión arterial (tensión alta)?'
-    ].map(map_yes_no_maybe)
+
+def derive_inputs(df: pd.DataFrame, bmi_bounds: tuple = None, unknown: dict = None) -> pd.DataFrame:
+    """
+    Parte determinista de `derive_variables`: añade a `df` todas las
+    variables que no dependen del ruido simulado, incluidas las entradas de
+    los simuladores (BMI_norm, HR_base...), y lo devuelve.
+    """
+    n = len(df)
+
+    def mapped(key):
+        return map_categories(df[key], FIELD_MAPPERS[key], unknown)
+
+    # 1) Limpieza básica
+    with instrument.stage('1_limpieza', rows=n):
+        df['Peso'] = parse_measure(df['weight'])
+        df['Estatura'] = parse_measure(df['height'])
+        df['Edad'] = df['age']
+        # Masculino → 1; Femenino o sin respuesta → 0
+        df['Sexo_num'] = (df['sex'] == 'Masculino').astype(int)
+        df['Diabetes'] = mapped('diabetes')
+        df['Hipertension'] = mapped('hypertension')
 
     # 2) Lifestyle
-    df['Activity_days'] = df[
-        'Actividad física semanal: ¿Cuántos días a la semana realiza, al menos, 30 minutos de actividad física (moderada o intensa: caminar, nadar, etc.)?'
-    ].map(map_weekly_freq)
-    df['Activity_min_wk'] = df['Activity_days'] * 30.0
-
-    # Consumo de alcohol (columna corregida)
-    df['Alcohol_wk'] = df[
-        'Consumo de alcohol: ¿Con qué frecuencia consume bebidas alcohólicas (cerveza, vino, licores)?'
-    ].map(map_weekly_freq)
-
-    # Dieta y otros consumos
-    df['Diet_q']    = df.apply(compute_diet_quality, axis=1)
-    df['SatFat_wk'] = df[
-        'Consumo de grasas saturadas: ¿Con qué frecuencia consume alimentos ricos en grasas saturadas (hamburguesas, patatas fritas, carnes rojas con grasa, quesos curados, etc.)?'
-    ].map(map_weekly_freq)
-    df['Sugary_wk'] = df[
-        'Bebidas azucaradas: ¿Cuántas veces por semana consume refrescos, jugos envasados o bebidas energéticas azucaradas?'
-    ].map(map_weekly_freq)
-    df['Salt_wk']   = df[
-        'Uso de sal en la dieta: ¿Con qué frecuencia usa sal de adición para las comidas o ingiere snacks salados?'
-    ].map(map_weekly_freq)
-    
-    # Hábitos nocivos (tabaco, vapeo, estupefacientes)
-    df['Harmful_habits'] = df.apply(compute_harmful_habits_index, axis=1)
-    
-    # Crear columnas individuales para cada componente
-    df['Tobacco'] = df[
-        'Frecuencia de consumo de tabaco: ¿Con qué frecuencia consume tabaco (cigarros, puros, etc.)?'
-    ].map(map_tobacco_consumption)
-    
-    df['Vaping'] = df[
-        'Frecuencia de consumo de cigarrillos electrónicos o cachimba : ¿Con qué frecuencia utiliza dispositivos como cigarrillos electrónicos o cachimba?'
-    ].map(map_tobacco_consumption)
-    
-    df['Drugs'] = df[
-        'Frecuencia de consumo de estupefacientes: ¿Con qué frecuencia consume sustancias psicoactivas?'
-    ].map(map_tobacco_consumption)
+    with instrument.stage('2_estilo_vida', rows=n):
+        df['Activity_days'] = mapped('activity')
+        df['Activity_min_wk'] = df['Activity_days'] * 30.0
+
+        # Consumo de alcohol (columna corregida)
+        df['Alcohol_wk'] = mapped('alcohol')
+
+        # Dieta y otros consumos
+        df['Self_diet_q'] = mapped('diet_self')
+        df['SatFat_wk'] = mapped('satfat')
+        df['Sugary_wk'] = mapped('sugary')
+        df['Salt_wk']   = mapped('salt')
+        df['Diet_q']    = diet_quality_index(
+            df['Self_diet_q'], df['Salt_wk'], df['Sugary_wk'], df['SatFat_wk'], df['Alcohol_wk']
+        )
+
+        # Hábitos nocivos (tabaco, vapeo, estupefacientes): componentes individuales
+        df['Tobacco'] = mapped('tobacco')
+
+        df['Vaping'] = mapped('vaping')
+
+        df['Drugs'] = mapped('drugs')
+        df['Harmful_habits'] = harmful_habits_index(df['Tobacco'], df['Vaping'], df['Drugs'])
 
     # 3) Antecedentes familiares y estrés/ansiedad
-    df['FamHyper']   = df[
-        'Historial familiar: ¿Tiene antecedentes familiares de hipertensión arterial (tensión alta)?'
-    ].map(map_yes_no_maybe)
-    df['FamInfarct'] = df[
-        'Historial familiar: ¿Tiene antecedentes familiares de infarto de miocardio?'
-    ].map(map_yes_no_maybe)
-    df['Anxiety_pct']= df[
-        'Ansiedad: En una escala de 0 a 10, ¿padece o ha padecido ansiedad en el último año?'
-    ].astype(float) * 10.0
-    df['Stress_pct'] = df[
-        'Estrés: En una escala de 0 a 10, ¿padece o ha padecido estrés en el último año?'
-    ].astype(float) * 10.0
-
-    # 4) Variables derivadas de salud
-    df['BMI']       = df.apply(lambda r: compute_bmi(r['Peso'], r['Estatura']), axis=1)
-    df['BMI_norm']  = normalize_bmi_series(df['BMI'])
-    df['BP_systolic']= df.apply(
-        lambda r: compute_systolic_bp(r['Edad'], r['BMI_norm'], r['Salt_wk'], r['Diet_q'], r['Activity_min_wk']),
-        axis=1
-    )
-    df['LDL']       = df.apply(lambda r: compute_ldl(r['BMI_norm'], r['SatFat_wk'], r['Diet_q']), axis=1)
-    df['HDL']       = df.apply(lambda r: compute_hdl(r['BMI_norm'], r['Activity_min_wk'], r['Diet_q']), axis=1)
-    df['Glucemia']  = df.apply(lambda r: compute_glucose(r['BMI_norm'], r['Sugary_wk'], r['Activity_min_wk']), axis=1)
-    df['HR_base']   = df[
-        'Frecuencia cardiaca: Si conoce el valor de sus pulsaciones en reposo, marque la opción más adecuada'
-    ].map(parse_heart_rate)
-    df['HR_rest']   = df.apply(
-        lambda r: compute_resting_hr(r['HR_base'], r['Stress_pct'], r['Anxiety_pct'], r['Activity_min_wk']),
-        axis=1
-    )
-    df['Blood_sugar'] = df['Glucemia']
-
-    # 5) Selección y exportación
-    out = df[[
-        'Edad','Sexo_num','Diabetes','Hipertension','BMI','BMI_norm',
-        'BP_systolic','LDL','HDL','Glucemia','Blood_sugar','HR_rest',
-        'FamHyper','FamInfarct','Stress_pct','Anxiety_pct',
-        'Activity_min_wk','Alcohol_wk','Diet_q','SatFat_wk','Sugary_wk','Salt_wk',
-        'Harmful_habits','Tobacco','Vaping','Drugs'
-    ]]
-    out.to_csv('variables_generadas.csv', index=False)
+    with instrument.stage('3_antecedentes', rows=n):
+        df['FamHyper']   = mapped('fam_hypertension')
+        df['FamInfarct'] = mapped('fam_infarct')
+        df['Anxiety_pct']= df['anxiety'].astype(float) * 10.0
+        df['Stress_pct'] = df['stress'].astype(float) * 10.0
+
+    # 4) IMC y pulso de partida
+    with instrument.stage('4_imc', rows=n):
+        df['BMI']       = bmi_from_measures(df['Peso'], df['Estatura'])
+        df['BMI_norm']  = normalize_bmi_series(df['BMI'], bmi_bounds)
+        df['HR_base']   = mapped('heart_rate')
+
+    return df
+
+def derive_variables(df: pd.DataFrame, rngs: dict, bmi_bounds: tuple = None,
+                     unknown: dict = None) -> pd.DataFrame:
+    """
+    Deriva las variables de salud de un bloque de respuestas de la encuesta
+    leído con `read_survey` (columnas ya renombradas a las claves del
+    registro de `esquema_encuesta`). Con `bmi_bounds` = (mín, máx) el IMC
+    se normaliza contra esos extremos en lugar de los del propio bloque.
+    """
+    df = derive_inputs(df, bmi_bounds, unknown)
+
+    # 5) Biomarcadores simulados
+    with instrument.stage('5_biomedicas', rows=len(df)):
+        df['BP_systolic']= simulate_systolic_bp(
+            df['Edad'], df['BMI_norm'], df['Salt_wk'], df['Diet_q'], df['Activity_min_wk'],
+            rngs['BP_systolic']
+        )
+        df['LDL']       = simulate_ldl(df['BMI_norm'], df['SatFat_wk'], df['Diet_q'], rngs['LDL'])
+        df['HDL']       = simulate_hdl(df['BMI_norm'], df['Activity_min_wk'], df['Diet_q'], rngs['HDL'])
+        df['Glucemia']  = simulate_glucose(df['BMI_norm'], df['Sugary_wk'], df['Activity_min_wk'], rngs['Glucemia'])
+        df['HR_rest']   = simulate_resting_hr(
+            df['HR_base'], df['Stress_pct'], df['Anxiety_pct'], df['Activity_min_wk'], rngs['HR_rest']
+        )
+        df['Blood_sugar'] = df['Glucemia']
+
+    return df[OUTPUT_COLUMNS]
+
+def compute_bmi_bounds(path: str, chunksize: int) -> tuple:
+    """Primera pasada en streaming: mínimo y máximo global del IMC."""
+    mi, ma = np.inf, -np.inf
+    for chunk in read_survey(path, keys=['weight', 'height'], chunksize=chunksize):
+        bmi = bmi_from_measures(parse_measure(chunk['weight']), parse_measure(chunk['height']))
+        if np.isfinite(bmi).any():
+            mi = min(mi, np.nanmin(bmi))
+            ma = max(ma, np.nanmax(bmi))
+    return mi, ma
+
+def generate_streaming(in_path: str, out_path: str, rngs: dict, chunksize: int,
+                       unknown: dict = None, fmt: str = None) -> int:
+    """
+    Procesa la encuesta por bloques de `chunksize` filas y va añadiendo el
+    resultado al fichero de salida. Hace dos pasadas: la primera sólo lee peso y
+    estatura para fijar los extremos del IMC, de modo que la salida coincide
+    con la del modo en memoria. Devuelve el número de filas escritas.
+    """
+    with instrument.stage('limites_imc'):
+        bmi_bounds = compute_bmi_bounds(in_path, chunksize)
+    rows = 0
+    with VariablesWriter(out_path, fmt) as writer:
+        for chunk in read_survey(in_path, chunksize=chunksize):
+            out = derive_variables(chunk, rngs, bmi_bounds, unknown)
+            with instrument.stage('escritura', rows=len(out)):
+                writer.write(out)
+            rows += len(out)
+    return rows
+
+# ——————————————————————
+# Generación en paralelo por fragmentos de filas
+# ——————————————————————
+def shard_seed(root: np.random.SeedSequence, index: int) -> np.random.SeedSequence:
+    """Flujo aleatorio del fragmento `index`: depende sólo de la raíz y del índice."""
+    return np.random.SeedSequence(root.entropy, spawn_key=root.spawn_key + (index,))
+
+def _derive_shard(shard: pd.DataFrame, seed: np.random.SeedSequence, bmi_bounds: tuple):
+    unknown = {}
+    out = derive_variables(shard, make_biomarker_rngs(seed), bmi_bounds, unknown)
+    return out, unknown
+
+def generate_parallel(in_path: str, out_path: str, seed=None, workers: int = 2,
+                      shard_rows: int = 100_000, unknown: dict = None, fmt: str = None) -> int:
+    """
+    Divide la encuesta en fragmentos de `shard_rows` filas y deriva las
+    variables en un pool de `workers` procesos. Cada fragmento usa su propio
+    flujo aleatorio derivado de `seed`, así que la salida depende de la
+    semilla y del tamaño de fragmento pero no del número de procesos. Los
+    extremos del IMC se calculan antes en el proceso principal (una pasada
+    por peso y estatura) y los resultados se escriben en el orden original. Devuelve las filas escritas.
+    """
+    root = np.random.SeedSequence(seed)
+    # 1) Extremos del IMC: un min/max sobre dos columnas, no compensa repartirlo
+    with instrument.stage('limites_imc'):
+        bmi_bounds = compute_bmi_bounds(in_path, shard_rows)
+    with ProcessPoolExecutor(max_workers=workers) as pool, VariablesWriter(out_path, fmt) as writer:
+        # 2) Derivación con una ventana acotada de fragmentos en vuelo
+        rows, pending = 0, deque()
+
+        def write_next():
+            nonlocal rows
+            out, shard_unknown = pending.popleft().result()
+            writer.write(out)
+            rows += len(out)
+            if unknown is not None:
+                for col, cats in shard_unknown.items():
+                    unknown.setdefault(col, set()).update(cats)
+
+        for i, shard in enumerate(read_survey(in_path, chunksize=shard_rows)):
+            pending.append(pool.submit(_derive_shard, shard, shard_seed(root, i), bmi_bounds))
+            if len(pending) >= 2 * workers:
+                write_next()
+        while pending:
+            write_next()
+    return rows
+
+# ——————————————————————
+# Modo incremental (sólo filas nuevas según "Marca temporal")
+# ——————————————————————
+STATE_VERSION = 1
+
+def parse_timestamps(series: pd.Series) -> pd.Series:
+    """Convierte la columna 'Marca temporal' (día/mes/año) a datetime."""
+    try:
+        return pd.to_datetime(series, dayfirst=True)
+    except (ValueError, TypeError):
+        return pd.to_datetime(series, dayfirst=True, format='mixed')
+
+def load_state(path: str) -> dict:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        state = json.load(f)
+    if state.get('version') != STATE_VERSION:
+        raise ValueError(f"Versión de estado no soportada en {path}: {state.get('version')}")
+    return state
+
+def save_state(path: str, state: dict) -> None:
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+def rescale_bmi_norm(out_path: str, bmi_bounds: tuple, chunksize: int) -> None:
+    """
+    Recalcula BMI_norm de las filas ya exportadas con los nuevos extremos y
+    desplaza los biomarcadores que dependen linealmente de él. El ruido ya
+    sorteado se conserva, así que el resultado coincide (salvo redondeo)
+    con regenerar todo desde cero.
+    """
+    tmp = out_path + '.tmp'
+    for i, chunk in enumerate(pd.read_csv(out_path, chunksize=chunksize)):
+        new_norm = normalize_bmi_series(chunk['BMI'], bmi_bounds)
+        delta = new_norm - chunk['BMI_norm']
+        for col, coef in BMI_NORM_COEFS.items():
+            chunk[col] = chunk[col] + coef * delta
+        chunk['BMI_norm'] = new_norm
+        chunk.to_csv(tmp, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+    os.replace(tmp, out_path)
+
+def generate_incremental(in_path: str, out_path: str, state_path: str, seed=None,
+                         chunksize: int = 100_000, unknown: dict = None) -> int:
+    """
+    Procesa sólo las respuestas posteriores a la última "Marca temporal" ya
+    procesada y las añade a `out_path`. El estado (última marca, extremos del
+    IMC y estado de los generadores) se guarda en `state_path`. Si los
+    extremos del IMC cambian, las filas anteriores se corrigen con
+    `rescale_bmi_norm`. Devuelve el número de filas nuevas.
+    """
+    state = load_state(state_path) if os.path.exists(out_path) else None
+    rngs = make_biomarker_rngs(seed)
+    if state is None:
+        last_ts, seen_at_last = None, 0
+        old_bounds = (np.inf, -np.inf)
+    else:
+        last_ts = pd.Timestamp(state['last_timestamp'])
+        seen_at_last = state['rows_at_last_timestamp']
+        old_bounds = (state['bmi_min'], state['bmi_max'])
+        for name, rng in rngs.items():
+            rng.bit_generator.state = state['rng_states'][name]
+
+    def new_rows_mask(ts, counter):
+        # Filas con la misma marca que la última procesada: se saltan las ya vistas
+        if last_ts is None:
+            return np.ones(len(ts), dtype=bool), counter
+        mask = (ts > last_ts).to_numpy(copy=True)
+        same = np.flatnonzero((ts == last_ts).to_numpy())
+        skip = min(len(same), max(seen_at_last - counter, 0))
+        mask[same[skip:]] = True
+        return mask, counter + len(same)
+
+    # 1) Primera pasada: filas nuevas y sus extremos de IMC
+    mi, ma = old_bounds
+    max_ts, rows_at_max, counter, n_new = None, 0, 0, 0
+    for chunk in read_survey(in_path, keys=['timestamp', 'weight', 'height'], chunksize=chunksize):
+        ts = parse_timestamps(chunk['timestamp'])
+        mask, counter = new_rows_mask(ts, counter)
+        chunk_max = ts.max()
+        if max_ts is None or chunk_max > max_ts:
+            max_ts, rows_at_max = chunk_max, int((ts == chunk_max).sum())
+        elif chunk_max == max_ts:
+            rows_at_max += int((ts == chunk_max).sum())
+        if not mask.any():
+            continue
+        n_new += int(mask.sum())
+        bmi = bmi_from_measures(parse_measure(chunk['weight'][mask]), parse_measure(chunk['height'][mask]))
+        if np.isfinite(bmi).any():
+            mi = min(mi, float(np.nanmin(bmi)))
+            ma = max(ma, float(np.nanmax(bmi)))
+    if n_new == 0:
+        return 0
+    bmi_bounds = (mi, ma)
+
+    # 2) Corregir filas anteriores sólo si los extremos han cambiado
+    if state is not None and bmi_bounds != old_bounds:
+        with instrument.stage('reescalado_imc'):
+            rescale_bmi_norm(out_path, bmi_bounds, chunksize)
+
+    # 3) Derivar y añadir las filas nuevas
+    counter, first = 0, state is None
+    for chunk in read_survey(in_path, chunksize=chunksize):
+        mask, counter = new_rows_mask(parse_timestamps(chunk['timestamp']), counter)
+        if not mask.any():
+            continue
+        out = derive_variables(chunk[mask].copy(), rngs, bmi_bounds, unknown)
+        with instrument.stage('escritura', rows=len(out)):
+            out.to_csv(out_path, mode='w' if first else 'a', header=first, index=False)
+        first = False
+
+    save_state(state_path, {
+        'version': STATE_VERSION,
+        'last_timestamp': max_ts.isoformat(),
+        'rows_at_last_timestamp': rows_at_max,
+        'bmi_min': mi,
+        'bmi_max': ma,
+        'rng_states': {name: rng.bit_generator.state for name, rng in rngs.items()},
+    })
+    return n_new
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Genera variables_generadas.csv a partir de encuesta.csv')
+    parser.add_argument('--input', default='encuesta.csv',
+                        help='Exportación de la encuesta (CSV con ;), o un directorio o patrón glob '
+                             'de varias exportaciones que se unen sin duplicados')
+    parser.add_argument('--output', default='variables_generadas.csv',
+                        help='Tabla de variables derivadas (.csv, .parquet, .feather, .arrow o directorio .mmap)')
+    parser.add_argument('--format', choices=['csv', 'parquet', 'feather', 'arrow', 'mmap'], default=None,
+                        help='Formato de salida (por defecto, según la extensión de --output)')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Semilla raíz de los biomarcadores simulados (salida reproducible)')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='Procesar en streaming por bloques de N filas (memoria acotada)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Derivar en paralelo con N procesos (por fragmentos de --shard-rows filas); '
+                             'con varias exportaciones, procesos que las indexan')
+    parser.add_argument('--shard-rows', type=int, default=100_000,
+                        help='Filas por fragmento en el modo --workers')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Procesar sólo las respuestas nuevas y añadirlas a la salida')
+    parser.add_argument('--state', default='variables_generadas.estado.json',
+                        help='Fichero de estado del modo incremental')
+    instrumentacion.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentacion.configure_from_args(args)
+    fmt = args.format or detect_format(args.output)
+    if args.incremental and fmt != 'csv':
+        parser.error('el modo --incremental sólo admite salida CSV')
+    multi = os.path.isdir(args.input) or glob.has_magic(args.input)
+    if multi and args.incremental:
+        parser.error('el modo --incremental sólo admite una exportación como --input')
+    rngs = make_biomarker_rngs(args.seed)
+
+    # Respuestas sin regla de mapeo, agrupadas por columna
+    unknown = {}
+
+    if args.incremental:
+        n_new = generate_incremental(args.input, args.output, args.state, args.seed,
+                                     args.chunksize or 100_000, unknown)
+        print(f"Filas nuevas procesadas: {n_new}")
+    elif multi:
+        from ingesta import generate_merged
+        info = generate_merged(args.input, args.output, rngs, args.chunksize or 100_000,
+                               args.workers, unknown, fmt)
+        print(f"{info['files']} exportaciones: {info['read']} filas leídas, "
+              f"{info['duplicates']} duplicadas descartadas, {info['rows']} derivadas")
+    elif args.workers:
+        generate_parallel(args.input, args.output, args.seed, args.workers, args.shard_rows,
+                          unknown, fmt)
+    elif args.chunksize:
+        generate_streaming(args.input, args.output, rngs, args.chunksize, unknown, fmt)
+    else:
+        with instrument.stage('lectura'):
+            df = read_survey(args.input)
+        out = derive_variables(df, rngs, unknown=unknown)
+        with instrument.stage('escritura', rows=len(out)):
+            write_variables(out, args.output, fmt)
+    report_unrecognized(unknown)
+    instrumentacion.finish_from_args(args)
@@ -1,21 +1,310 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import numpy as np
+"""
+Figuras de docs/ a partir de variables_generadas.
+
+Cada figura se describe en la tabla FIGURES (tipo, columnas, bins, títulos,
+etiquetas y categoría); la categoría decide la carpeta docs/png/<categoría>/
+según docs/png/estructura. Las figuras se dibujan en paralelo, una por
+tarea, con el backend no interactivo Agg.
+
+Cada figura se identifica por un hash de sus datos de entrada, sus bins y
+su especificación; si coincide con el guardado en la caché de la carpeta de
+salida y el fichero existe, no se vuelve a dibujar (salvo con --force).
+
+Cada figura se construye una sola vez y se guarda en todos los formatos y
+resoluciones pedidos: PNG en docs/png/<categoría>/, los vectoriales (SVG,
+PDF) en docs/<formato>/ y, opcionalmente, una miniatura PNG reducida en
+docs/miniaturas/ para el README.
+
+Los datos se recorren por bloques: una pasada calcula el mínimo y el máximo
+de las columnas con bins según los datos y otra acumula los conteos de cada
+histograma y gráfico circular (y media/desviación de las barras). A
+matplotlib sólo le llegan esos agregados, así que la memoria no crece con
+el número de filas.
+
+Importar el módulo no lee datos ni dibuja nada; matplotlib, seaborn y
+patheffects se cargan sólo al dibujar. Desde la línea de comandos se puede
+limitar el trabajo a unas figuras (--only imc,presion_arterial) o a unas
+categorías (--group biomedicos).
+"""
+import argparse
+import hashlib
+import json
 import os
-import seaborn as sns
-import matplotlib.patheffects as path_effects
+from concurrent.futures import ProcessPoolExecutor
 
-# Leer datos
-csv = 'variables_generadas.csv'
-df = pd.read_csv(csv)
+from functools import lru_cache
 
-# Crear carpeta docs si no existe
-os.makedirs('docs', exist_ok=True)
-
-# Paleta de colores
-palette = sns.color_palette('tab10', 10)
+import pandas as pd
+import numpy as np
 
-def pie_bonito(labels, counts, colors, title, filename):
+from almacenamiento import iter_variables
+
+YES_NO_MAYBE = (['No', 'Tal vez', 'Sí'], [0.0, 0.5, 1.0])
+UNIT_BINS = (0, 1.1, 0.1)
+PCT_BINS = (0, 101, 10)
+
+# ——————————————————————
+# Tabla de figuras
+# ——————————————————————
+# kind: 'hist' (bins 'data' = 10 intervalos entre mín. y máx.; o (inicio, fin, paso)
+#       para np.arange), 'pie' (values/labels/colors) o 'bar' (media ± desviación
+#       de varias columnas).
+# ticks: 'int' trunca las marcas del eje X, 'round' las redondea y None las deja tal cual.
+FIGURES = [
+    dict(name='edad', category='edad y sexo', kind='hist', column='Edad', bins='data', ticks='int',
+         title='Distribución de la Edad', xlabel='Edad (años)'),
+    dict(name='sexo', category='edad y sexo', kind='pie', column='Sexo_num',
+         labels=['Femenino', 'Masculino'], values=[0, 1], colors=[0, 1],
+         title='Distribución por Sexo'),
+    dict(name='diabetes', category='enfermedades', kind='pie', column='Diabetes',
+         labels=YES_NO_MAYBE[0], values=YES_NO_MAYBE[1], colors=[2, 3, 4],
+         title='Distribución de Diabetes'),
+    dict(name='hipertension', category='enfermedades', kind='pie', column='Hipertension',
+         labels=YES_NO_MAYBE[0], values=YES_NO_MAYBE[1], colors=[5, 6, 7],
+         title='Distribución de Hipertensión'),
+    dict(name='imc', category='biomedicos', kind='hist', column='BMI', bins='data', ticks='round',
+         title='Distribución del IMC', xlabel='IMC (kg/m²)'),
+    dict(name='imc_normalizado', category='biomedicos', kind='hist', column='BMI_norm',
+         bins=UNIT_BINS, ticks=None, title='IMC Normalizado', xlabel='IMC normalizado'),
+    dict(name='presion_arterial', category='biomedicos', kind='hist', column='BP_systolic',
+         bins='data', ticks='round', title='Presión Arterial Sistólica (mmHg)',
+         xlabel='Presión arterial (mmHg)'),
+    dict(name='colesterol_ldl', category='biomedicos', kind='hist', column='LDL', bins='data',
+         ticks='round', title='Colesterol LDL (mg/dL)', xlabel='LDL (mg/dL)'),
+    dict(name='colesterol_hdl', category='biomedicos', kind='hist', column='HDL', bins='data',
+         ticks='round', title='Colesterol HDL (mg/dL)', xlabel='HDL (mg/dL)'),
+    dict(name='glucemia', category='biomedicos', kind='hist', column='Glucemia', bins='data',
+         ticks='round', title='Glucemia en Ayunas (mg/dL)', xlabel='Glucemia (mg/dL)'),
+    dict(name='azucar_sangre', category='biomedicos', kind='hist', column='Blood_sugar',
+         bins='data', ticks='round', title='Azúcar en Sangre (mg/dL)',
+         xlabel='Azúcar en sangre (mg/dL)'),
+    dict(name='frecuencia_cardiaca', category='biomedicos', kind='hist', column='HR_rest',
+         bins='data', ticks='round', title='Frecuencia Cardíaca en Reposo (lpm)',
+         xlabel='Frecuencia cardíaca (lpm)'),
+    dict(name='historia_hipertension', category='familiar', kind='pie', column='FamHyper',
+         labels=YES_NO_MAYBE[0], values=YES_NO_MAYBE[1], colors=[8, 9, 0],
+         title='Historia Familiar de Hipertensión'),
+    dict(name='historia_infarto', category='familiar', kind='pie', column='FamInfarct',
+         labels=YES_NO_MAYBE[0], values=YES_NO_MAYBE[1], colors=[1, 2, 3],
+         title='Historia Familiar de Infarto'),
+    dict(name='estres', category='psicologico', kind='hist', column='Stress_pct', bins=PCT_BINS,
+         ticks=None, title='Estrés (%)', xlabel='Estrés (%)'),
+    dict(name='ansiedad', category='psicologico', kind='hist', column='Anxiety_pct',
+         bins=PCT_BINS, ticks=None, title='Ansiedad (%)', xlabel='Ansiedad (%)'),
+    dict(name='actividad_fisica', category='habitos de vida', kind='hist',
+         column='Activity_min_wk', bins='data', ticks='round',
+         title='Actividad Física Semanal (min)', xlabel='Minutos/semana'),
+    dict(name='calidad_dieta', category='habitos de vida', kind='hist', column='Diet_q',
+         bins=UNIT_BINS, ticks=None, title='Calidad de la Dieta (escala)',
+         xlabel='Calidad de dieta'),
+    dict(name='grasas_saturadas', category='biomedicos', kind='hist', column='SatFat_wk',
+         bins='data', ticks='round', title='Consumo de Grasas Saturadas (veces/semana)',
+         xlabel='Veces por semana'),
+    dict(name='bebidas_azucaradas', category='habitos de vida', kind='hist', column='Sugary_wk',
+         bins='data', ticks='round', title='Consumo de Bebidas Azucaradas (veces/semana)',
+         xlabel='Veces por semana'),
+    dict(name='alcohol', category='habitos de vida', kind='hist', column='Alcohol_wk',
+         bins='data', ticks='round', title='Consumo de Alcohol (veces/semana)',
+         xlabel='Veces por semana'),
+    dict(name='habitos_nocivos', category='habitos nocivos', kind='hist', column='Harmful_habits',
+         bins=UNIT_BINS, ticks=None, title='Índice de Hábitos Nocivos', xlabel='Índice (0-1)'),
+    dict(name='tabaco', category='habitos nocivos', kind='hist', column='Tobacco',
+         bins=UNIT_BINS, ticks=None, title='Consumo de Tabaco', xlabel='Índice (0-1)'),
+    dict(name='vapeo', category='habitos nocivos', kind='hist', column='Vaping',
+         bins=UNIT_BINS, ticks=None, title='Uso de Cigarrillos Electrónicos/Cachimba',
+         xlabel='Índice (0-1)'),
+    dict(name='estupefacientes', category='habitos nocivos', kind='hist', column='Drugs',
+         bins=UNIT_BINS, ticks=None, title='Consumo de Estupefacientes', xlabel='Índice (0-1)'),
+    dict(name='habitos_nocivos_componentes', category='habitos nocivos', kind='bar',
+         columns=['Tobacco', 'Vaping', 'Drugs'],
+         labels=['Tabaco', 'Vapeo/Electrónicos', 'Estupefacientes'],
+         title='Componentes del Índice de Hábitos Nocivos (Promedio)', ylabel='Índice (0-1)'),
+]
+
+def select_figures(only: list = None, groups: list = None) -> list:
+    """Figuras de FIGURES cuyo nombre está en `only` o cuya categoría está en `groups`."""
+    if not only and not groups:
+        return list(FIGURES)
+    names = {s['name'] for s in FIGURES}
+    categories = {s['category'] for s in FIGURES}
+    unknown = [n for n in only or [] if n not in names]
+    unknown += [g for g in groups or [] if g not in categories]
+    if unknown:
+        raise ValueError(f"Figuras o categorías desconocidas: {', '.join(unknown)}")
+    return [s for s in FIGURES if s['name'] in (only or []) or s['category'] in (groups or [])]
+
+def figure_columns(spec: dict) -> list:
+    return spec['columns'] if spec['kind'] == 'bar' else [spec['column']]
+
+# ——————————————————————
+# Formatos de salida
+# ——————————————————————
+RASTER_FORMATS = ['png']
+VECTOR_FORMATS = ['svg', 'pdf']
+# Sin fecha de creación, para que el mismo dibujo produzca el mismo fichero
+VECTOR_METADATA = {'svg': {'Date': None}, 'pdf': {'CreationDate': None}}
+THUMBNAIL_DIR = 'miniaturas'
+
+def figure_outputs(spec: dict, out_dir: str, formats: list = ('png',), dpis: list = None,
+                   thumb_dpi: int = None) -> list:
+    """
+    Ficheros de una figura como (ruta, argumentos de savefig). El primer DPI
+    da el nombre sin sufijo; los siguientes añaden _<dpi>dpi. Sin `dpis` se
+    usa el DPI de la figura (el predeterminado de matplotlib).
+    """
+    outputs = []
+    for fmt in formats:
+        if fmt in VECTOR_FORMATS:
+            path = os.path.join(out_dir, fmt, f"{spec['name']}.{fmt}")
+            outputs.append((path, {'format': fmt, 'metadata': VECTOR_METADATA[fmt]}))
+            continue
+        for i, dpi in enumerate(dpis or ['figure']):
+            suffix = f'_{dpi}dpi' if i else ''
+            path = os.path.join(out_dir, fmt, spec['category'], f"{spec['name']}{suffix}.{fmt}")
+            outputs.append((path, {'format': fmt, 'dpi': dpi}))
+    if thumb_dpi:
+        path = os.path.join(out_dir, THUMBNAIL_DIR, f"{spec['name']}.png")
+        outputs.append((path, {'format': 'png', 'dpi': thumb_dpi}))
+    return outputs
+
+# ——————————————————————
+# Agregación por bloques
+# ——————————————————————
+def chunk_source(data, columns: list, chunksize: int = 1_000_000):
+    """
+    Devuelve una función que abre un recorrido nuevo por bloques de `data`
+    (un DataFrame o la ruta de la tabla de variables), para poder hacer
+    varias pasadas.
+    """
+    if isinstance(data, pd.DataFrame):
+        return lambda: [data[columns]]
+    return lambda: iter_variables(data, columns=columns, chunksize=chunksize)
+
+def column_bounds(chunks, columns: list) -> dict:
+    """Primera pasada: (mín, máx) de cada columna, ignorando NaN."""
+    lo = {c: np.inf for c in columns}
+    hi = {c: -np.inf for c in columns}
+    for chunk in chunks:
+        for c in columns:
+            values = chunk[c].to_numpy(dtype=float)
+            values = values[~np.isnan(values)]
+            if len(values):
+                lo[c] = min(lo[c], values.min())
+                hi[c] = max(hi[c], values.max())
+    return {c: (lo[c], hi[c]) for c in columns}
+
+def figure_bins(spec: dict, bounds: dict) -> np.ndarray:
+    if spec['bins'] == 'data':
+        return np.linspace(*bounds[spec['column']], 11)
+    return np.arange(*spec['bins'])
+
+def _merge_moments(acc: tuple, values: np.ndarray) -> tuple:
+    # Combinación de (n, media, M2) por bloques (Chan et al.)
+    n_b = len(values)
+    if n_b == 0:
+        return acc
+    n_a, mean_a, m2_a = acc
+    mean_b = values.mean()
+    m2_b = ((values - mean_b) ** 2).sum()
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    return n, mean_a + delta * n_b / n, m2_a + m2_b + delta ** 2 * n_a * n_b / n
+
+def aggregate_figures(source, specs: list) -> dict:
+    """
+    Agregados que necesita cada figura, por nombre: bins y conteos de los
+    histogramas, conteos de los circulares y media/desviación de las barras.
+    `source` es una función que devuelve un recorrido por bloques.
+    """
+    data_bins = sorted({s['column'] for s in specs if s['kind'] == 'hist' and s['bins'] == 'data'})
+    bounds = column_bounds(source(), data_bins) if data_bins else {}
+    aggs = {}
+    for spec in specs:
+        if spec['kind'] == 'hist':
+            bins = figure_bins(spec, bounds)
+            aggs[spec['name']] = {'bins': bins, 'counts': np.zeros(len(bins) - 1, dtype=np.int64)}
+        elif spec['kind'] == 'pie':
+            aggs[spec['name']] = {'counts': np.zeros(len(spec['values']), dtype=np.int64)}
+        else:
+            aggs[spec['name']] = {c: (0, 0.0, 0.0) for c in spec['columns']}
+
+    for chunk in source():
+        for spec in specs:
+            agg = aggs[spec['name']]
+            if spec['kind'] == 'bar':
+                for c in spec['columns']:
+                    values = chunk[c].to_numpy(dtype=float)
+                    agg[c] = _merge_moments(agg[c], values[~np.isnan(values)])
+                continue
+            values = chunk[spec['column']].to_numpy(dtype=float)
+            if spec['kind'] == 'hist':
+                agg['counts'] += np.histogram(values[~np.isnan(values)], bins=agg['bins'])[0]
+            else:
+                agg['counts'] += [np.count_nonzero(values == v) for v in spec['values']]
+
+    # Barras: media y desviación muestral (ddof=1), como pandas
+    for spec in specs:
+        if spec['kind'] == 'bar':
+            moments = [aggs[spec['name']][c] for c in spec['columns']]
+            aggs[spec['name']] = {
+                'means': np.array([mean if n else np.nan for n, mean, _ in moments]),
+                'stds': np.array([np.sqrt(m2 / (n - 1)) if n > 1 else np.nan
+                                  for n, _, m2 in moments]),
+            }
+    return aggs
+
+# ——————————————————————
+# Caché direccionada por contenido
+# ——————————————————————
+# Subir CACHE_VERSION cuando cambie la forma de dibujar, para invalidar la caché
+CACHE_VERSION = 2
+CACHE_FILE = '.cache_figuras.json'
+
+def figure_key(spec: dict, agg: dict, outputs: list) -> str:
+    """Hash de la especificación, las salidas y los agregados, que determinan la figura."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps({'version': CACHE_VERSION, 'spec': spec, 'outputs': outputs},
+                        sort_keys=True).encode())
+    for name in sorted(agg):
+        h.update(name.encode())
+        h.update(np.ascontiguousarray(agg[name], dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+def load_cache(out_dir: str) -> dict:
+    path = os.path.join(out_dir, CACHE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_cache(out_dir: str, cache: dict) -> None:
+    path = os.path.join(out_dir, CACHE_FILE)
+    os.makedirs(out_dir, exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+# ——————————————————————
+# Dibujo
+# ——————————————————————
+def _pyplot():
+    import matplotlib
+    matplotlib.use('Agg')
+    # Identificadores internos de SVG estables entre ejecuciones
+    matplotlib.rcParams['svg.hashsalt'] = 'graficas'
+    import matplotlib.pyplot as plt
+    return plt
+
+@lru_cache(maxsize=None)
+def _palette():
+    # Paleta de colores
+    import seaborn as sns
+    return sns.color_palette('tab10', 10)
+
+def pie_bonito(labels, counts, colors, title):
+    import matplotlib.patheffects as path_effects
+    plt = _pyplot()
     # Filtrar valores 0
     filtered = [(l, c, col) for l, c, col in zip(labels, counts, colors) if c > 0]
     if not filtered:
@@ -50,361 +339,156 @@ def pie_bonito(labels, counts, colors, title, filename):
         text.set_weight('bold')
     ax.set_title(title, fontsize=20, weight='bold')
     plt.tight_layout()
-    plt.savefig(filename)
-    plt.close()
-
-# 1. Edad
-plt.figure(figsize=(7,5))
-bins = np.linspace(df['Edad'].min(), df['Edad'].max(), 11)
-n, bins, patches = plt.hist(df['Edad'], bins=bins, edgecolor='black')
-for i, patch in enumerate(patches):
-    patch.set_facecolor(palette[i % len(palette)])
-plt.title('Distribución de la Edad')
-plt.xlabel('Edad (años)')
-plt.ylabel('Número de personas')
-plt.xticks(bins.astype(int))
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('docs/edad.png')
-plt.close()
-
-# 2. Sexo (círculo)
-labels = ['Femenino', 'Masculino']
-counts = df['Sexo_num'].value_counts().sort_index()
-pie_bonito(labels, counts, [palette[0], palette[1]], 'Distribución por Sexo', 'docs/sexo.png')
-
-
-# 3. Diabetes (círculo)
-diab_labels = ['No', 'Tal vez', 'Sí']
-diab_counts = [sum(df['Diabetes'] == 0.0), sum(df['Diabetes'] == 0.5), sum(df['Diabetes'] == 1.0)]
-pie_bonito(diab_labels, diab_counts, [palette[2], palette[3], palette[4]], 'Distribución de Diabetes', 'docs/diabetes.png')
-
-
-# 4. Hipertensión (círculo)
-hip_labels = ['No', 'Tal vez', 'Sí']
-hip_counts = [sum(df['Hipertension'] == 0.0), sum(df['Hipertension'] == 0.5), sum(df['Hipertension'] == 1.0)]
-pie_bonito(hip_labels, hip_counts, [palette[5], palette[6], palette[7]], 'Distribución de Hipertensión', 'docs/hipertension.png')
-
-
-# 5. IMC
-plt.figure(figsize=(7,5))
-bins = np.linspace(df['BMI'].min(), df['BMI'].max(), 11)
-n, bins, patches = plt.hist(df['BMI'], bins=bins, edgecolor='black')
-for i, patch in enumerate(patches):
-    patch.set_facecolor(palette[i % len(palette)])
-plt.title('Distribución del IMC')
-plt.xlabel('IMC (kg/m²)')
-plt.ylabel('Número de personas')
-plt.xticks(bins.round(0).astype(int))
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('docs/imc.png')
-plt.close()
-
-# 6. IMC normalizado
-plt.figure(figsize=(7,5))
-bins = np.arange(0, 1.1, 0.1)
-n, bins, patches = plt.hist(df['BMI_norm'], bins=bins, edgecolor='black')
-for i, patch in enumerate(patches):
-    patch.set_facecolor(palette[i % len(palette)])
-plt.title('IMC Normalizado')
-plt.xlabel('IMC normalizado')
-plt.ylabel('Número de personas')
-plt.xticks(bins)
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('docs/imc_normalizado.png')
-plt.close()
-
-# 7. Presión arterial sistólica
-plt.figure(figsize=(7,5))
-bins = np.linspace(df['BP_systolic'].min(), df['BP_systolic'].max(), 11)
-n, bins, patches = plt.hist(df['BP_systolic'], bins=bins, edgecolor='black')
-for i, patch in enumerate(patches):
-    patch.set_facecolor(palette[i % len(palette)])
-plt.title('Presión Arterial Sistólica (mmHg)')
-plt.xlabel('Presión arterial (mmHg)')
-plt.ylabel('Número de personas')
-plt.xticks(bins.round(0).astype(int))
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('docs/presion_arterial.png')
-plt.close()
-
-# 8. Colesterol LDL
-plt.figure(figsize=(7,5))
-bins = np.linspace(df['LDL'].min(), df['LDL'].max(), 11)
-n, bins, patches = plt.hist(df['LDL'], bins=bins, edgecolor='black')
-for i, patch in enumerate(patches):
-    patch.set_facecolor(palette[i % len(palette)])
-plt.title('Colesterol LDL (mg/dL)')
-plt.xlabel('LDL (mg/dL)')
-plt.ylabel('Número de personas')
-plt.xticks(bins.round(0).astype(int))
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('docs/colesterol_ldl.png')
-plt.close()
-
-# 9. Colesterol HDL
-plt.figure(figsize=(7,5))
-bins = np.linspace(df['HDL'].min(), df['HDL'].max(), 11)
-n, bins, patches = plt.hist(df['HDL'], bins=bins, edgecolor='black')
-for i, patch in enumerate(patches):
-    patch.set_facecolor(palette[i % len(palette)])
-plt.title('Colesterol HDL (mg/dL)')
-plt.xlabel('HDL (mg/dL)')
-plt.ylabel('Número de personas')
-plt.xticks(bins.round(0).astype(int))
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('docs/colesterol_hdl.png')
-plt.close()
-
-# 10. Glucemia
-plt.figure(figsize=(7,5))
-bins = np.linspace(df['Glucemia'].min(), df['Glucemia'].max(), 11)
-n, bins, patches = plt.hist(df['Glucemia'], bins=bins, edgecolor='black')
-for i, patch in enumerate(patches):
-    patch.set_facecolor(palette[i % len(palette)])
-plt.title('Glucemia en Ayunas (mg/dL)')
-plt.xlabel('Glucemia (mg/dL)')
-plt.ylabel('Número de personas')
-plt.xticks(bins.round(0).astype(int))
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('docs/glucemia.png')
-plt.close()
-
-# 11. Azúcar en sangre (alias)
-plt.figure(figsize=(7,5))
-bins = np.linspace(df['Blood_sugar'].min(), df['Blood_sugar'].max(), 11)
-n, bins, patches = plt.hist(df['Blood_sugar'], bins=bins, edgecolor='black')
-for i, patch in enumerate(patches):
-    patch.set_facecolor(palette[i % len(palette)])
-plt.title('Azúcar en Sangre (mg/dL)')
-plt.xlabel('Azúcar en sangre (mg/dL)')
-plt.ylabel('Número de personas')
-plt.xticks(bins.round(0).astype(int))
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('docs/azucar_sangre.png')
-plt.close()
-
-# 12. Frecuencia cardíaca en reposo
-plt.figure(figsize=(7,5))
-bins = np.linspace(df['HR_rest'].min(), df['HR_rest'].max(), 11)
-n, bins, patches = plt.hist(df['HR_rest'], bins=bins, edgecolor='black')
-for i, patch in enumerate(patches):
-    patch.set_facecolor(palette[i % len(palette)])
-plt.title('Frecuencia Cardíaca en Reposo (lpm)')
-plt.xlabel('Frecuencia cardíaca (lpm)')
-plt.ylabel('Número de personas')
-plt.xticks(bins.round(0).astype(int))
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('docs/frecuencia_cardiaca.png')
-plt.close()
-
-# 13. Historia familiar hipertensión (círculo)
-hist_hip_labels = ['No', 'Tal vez', 'Sí']
-hist_hip_counts = [sum(df['FamHyper'] == 0.0), sum(df['FamHyper'] == 0.5), sum(df['FamHyper'] == 1.0)]
-pie_bonito(hist_hip_labels, hist_hip_counts, [palette[8], palette[9], palette[0]], 'Historia Familiar de Hipertensión', 'docs/historia_hipertension.png')
-
-
-# 14. Historia familiar infarto (círculo)
-hist_inf_labels = ['No', 'Tal vez', 'Sí']
-hist_inf_counts = [sum(df['FamInfarct'] == 0.0), sum(df['FamInfarct'] == 0.5), sum(df['FamInfarct'] == 1.0)]
-pie_bonito(hist_inf_labels, hist_inf_counts, [palette[1], palette[2], palette[3]], 'Historia Familiar de Infarto', 'docs/historia_infarto.png')
-
-
-# 15. Estrés (%)
-plt.figure(figsize=(7,5))
-bins = np.arange(0, 101, 10)
-n, bins, patches = plt.hist(df['Stress_pct'], bins=bins, edgecolor='black')
-for i, patch in enumerate(patches):
-    patch.set_facecolor(palette[i % len(palette)])
-plt.title('Estrés (%)')
-plt.xlabel('Estrés (%)')
-plt.ylabel('Número de personas')
-plt.xticks(bins)
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('docs/estres.png')
-plt.close()
-
-# 16. Ansiedad (%)
-plt.figure(figsize=(7,5))
-bins = np.arange(0, 101, 10)
-n, bins, patches = plt.hist(df['Anxiety_pct'], bins=bins, edgecolor='black')
-for i, patch in enumerate(patches):
-    patch.set_facecolor(palette[i % len(palette)])
-plt.title('Ansiedad (%)')
-plt.xlabel('Ansiedad (%)')
-plt.ylabel('Número de personas')
-plt.xticks(bins)
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('docs/ansiedad.png')
-plt.close()
-
-# 17. Actividad física semanal (min)
-plt.figure(figsize=(7,5))
-bins = np.linspace(df['Activity_min_wk'].min(), df['Activity_min_wk'].max(), 11)
-n, bins, patches = plt.hist(df['Activity_min_wk'], bins=bins, edgecolor='black')
-for i, patch in enumerate(patches):
-    patch.set_facecolor(palette[i % len(palette)])
-plt.title('Actividad Física Semanal (min)')
-plt.xlabel('Minutos/semana')
-plt.ylabel('Número de personas')
-plt.xticks(bins.round(0).astype(int))
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('docs/actividad_fisica.png')
-plt.close()
-
-# 18. Calidad de la dieta
-plt.figure(figsize=(7,5))
-bins = np.arange(0, 1.1, 0.1)
-n, bins, patches = plt.hist(df['Diet_q'], bins=bins, edgecolor='black')
-for i, patch in enumerate(patches):
-    patch.set_facecolor(palette[i % len(palette)])
-plt.title('Calidad de la Dieta (escala)')
-plt.xlabel('Calidad de dieta')
-plt.ylabel('Número de personas')
-plt.xticks(bins)
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('docs/calidad_dieta.png')
-plt.close()
-
-# 19. Consumo de grasas saturadas
-plt.figure(figsize=(7,5))
-bins = np.linspace(df['SatFat_wk'].min(), df['SatFat_wk'].max(), 11)
-n, bins, patches = plt.hist(df['SatFat_wk'], bins=bins, edgecolor='black')
-for i, patch in enumerate(patches):
-    patch.set_facecolor(palette[i % len(palette)])
-plt.title('Consumo de Grasas Saturadas (veces/semana)')
-plt.xlabel('Veces por semana')
-plt.ylabel('Número de personas')
-plt.xticks(bins.round(0).astype(int))
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('docs/grasas_saturadas.png')
-plt.close()
-
-# 20. Consumo de bebidas azucaradas
-plt.figure(figsize=(7,5))
-bins = np.linspace(df['Sugary_wk'].min(), df['Sugary_wk'].max(), 11)
-n, bins, patches = plt.hist(df['Sugary_wk'], bins=bins, edgecolor='black')
-for i, patch in enumerate(patches):
-    patch.set_facecolor(palette[i % len(palette)])
-plt.title('Consumo de Bebidas Azucaradas (veces/semana)')
-plt.xlabel('Veces por semana')
-plt.ylabel('Número de personas')
-plt.xticks(bins.round(0).astype(int))
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('docs/bebidas_azucaradas.png')
-plt.close()
-
-# 21. Consumo de alcohol
-plt.figure(figsize=(7,5))
-bins = np.linspace(df['Alcohol_wk'].min(), df['Alcohol_wk'].max(), 11)
-n, bins, patches = plt.hist(df['Alcohol_wk'], bins=bins, edgecolor='black')
-for i, patch in enumerate(patches):
-    patch.set_facecolor(palette[i % len(palette)])
-plt.title('Consumo de Alcohol (veces/semana)')
-plt.xlabel('Veces por semana')
-plt.ylabel('Número de personas')
-plt.xticks(bins.round(0).astype(int))
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('docs/alcohol.png')
-plt.close()
-
-# 22. Índice de hábitos nocivos
-plt.figure(figsize=(7,5))
-bins = np.arange(0, 1.1, 0.1)
-n, bins, patches = plt.hist(df['Harmful_habits'], bins=bins, edgecolor='black')
-for i, patch in enumerate(patches):
-    patch.set_facecolor(palette[i % len(palette)])
-plt.title('Índice de Hábitos Nocivos')
-plt.xlabel('Índice (0-1)')
-plt.ylabel('Número de personas')
-plt.xticks(bins)
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('docs/habitos_nocivos.png')
-plt.close()
-
-# 23. Consumo de tabaco
-plt.figure(figsize=(7,5))
-bins = np.arange(0, 1.1, 0.1)
-n, bins, patches = plt.hist(df['Tobacco'], bins=bins, edgecolor='black')
-for i, patch in enumerate(patches):
-    patch.set_facecolor(palette[i % len(palette)])
-plt.title('Consumo de Tabaco')
-plt.xlabel('Índice (0-1)')
-plt.ylabel('Número de personas')
-plt.xticks(bins)
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('docs/tabaco.png')
-plt.close()
-
-# 24. Consumo de vapeo/cigarrillos electrónicos
-plt.figure(figsize=(7,5))
-bins = np.arange(0, 1.1, 0.1)
-n, bins, patches = plt.hist(df['Vaping'], bins=bins, edgecolor='black')
-for i, patch in enumerate(patches):
-    patch.set_facecolor(palette[i % len(palette)])
-plt.title('Uso de Cigarrillos Electrónicos/Cachimba')
-plt.xlabel('Índice (0-1)')
-plt.ylabel('Número de personas')
-plt.xticks(bins)
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('docs/vapeo.png')
-plt.close()
-
-# 25. Consumo de estupefacientes
-plt.figure(figsize=(7,5))
-bins = np.arange(0, 1.1, 0.1)
-n, bins, patches = plt.hist(df['Drugs'], bins=bins, edgecolor='black')
-for i, patch in enumerate(patches):
-    patch.set_facecolor(palette[i % len(palette)])
-plt.title('Consumo de Estupefacientes')
-plt.xlabel('Índice (0-1)')
-plt.ylabel('Número de personas')
-plt.xticks(bins)
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('docs/estupefacientes.png')
-plt.close()
-
-# 26. Gráfico combinado de hábitos nocivos (gráfico de barras)
-plt.figure(figsize=(10,6))
-categories = ['Tabaco', 'Vapeo/Electrónicos', 'Estupefacientes']
-means = [df['Tobacco'].mean(), df['Vaping'].mean(), df['Drugs'].mean()]
-std = [df['Tobacco'].std(), df['Vaping'].std(), df['Drugs'].std()]
-
-bars = plt.bar(categories, means, color=palette[:3], yerr=std, capsize=10, 
-          edgecolor='black', linewidth=1.5)
-
-for bar in bars:
-    height = bar.get_height()
-    plt.annotate(f'{height:.3f}',
-                xy=(bar.get_x() + bar.get_width() / 2, height),
-                xytext=(0, 3),
-                textcoords="offset points",
-                ha='center', va='bottom',
-                fontsize=12, fontweight='bold')
-
-plt.title('Componentes del Índice de Hábitos Nocivos (Promedio)', fontsize=16)
-plt.ylabel('Índice (0-1)', fontsize=12)
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.savefig('docs/habitos_nocivos_componentes.png')
-plt.close()
-
+    return fig
+
+def plot_hist(spec: dict, bins: np.ndarray, counts: np.ndarray):
+    plt, palette = _pyplot(), _palette()
+    fig = plt.figure(figsize=(7,5))
+    # Un punto por bin con su conteo como peso: mismas barras que con los datos
+    n, bins, patches = plt.hist(bins[:-1], bins=bins, weights=counts, edgecolor='black')
+    for i, patch in enumerate(patches):
+        patch.set_facecolor(palette[i % len(palette)])
+    plt.title(spec['title'])
+    plt.xlabel(spec['xlabel'])
+    plt.ylabel('Número de personas')
+    if spec['ticks'] == 'int':
+        plt.xticks(bins.astype(int))
+    elif spec['ticks'] == 'round':
+        plt.xticks(bins.round(0).astype(int))
+    else:
+        plt.xticks(bins)
+    plt.grid(axis='y', linestyle='--', alpha=0.7)
+    plt.tight_layout()
+    return fig
+
+def plot_pie(spec: dict, counts: np.ndarray):
+    palette = _palette()
+    return pie_bonito(spec['labels'], [int(c) for c in counts],
+                      [palette[i] for i in spec['colors']], spec['title'])
+
+def plot_bar(spec: dict, means: np.ndarray, std: np.ndarray):
+    plt, palette = _pyplot(), _palette()
+    fig = plt.figure(figsize=(10,6))
+
+    bars = plt.bar(spec['labels'], means, color=palette[:len(means)], yerr=std, capsize=10,
+                   edgecolor='black', linewidth=1.5)
+
+    for bar in bars:
+        height = bar.get_height()
+        plt.annotate(f'{height:.3f}',
+                    xy=(bar.get_x() + bar.get_width() / 2, height),
+                    xytext=(0, 3),
+                    textcoords="offset points",
+                    ha='center', va='bottom',
+                    fontsize=12, fontweight='bold')
+
+    plt.title(spec['title'], fontsize=16)
+    plt.ylabel(spec['ylabel'], fontsize=12)
+    plt.grid(axis='y', linestyle='--', alpha=0.7)
+    plt.tight_layout()
+    return fig
+
+def render_figure(spec: dict, agg: dict, outputs: list) -> list:
+    """
+    Dibuja una figura (una tarea del pool) a partir de sus agregados una sola
+    vez, la guarda en cada salida de `outputs` y devuelve las rutas escritas.
+    """
+    if spec['kind'] == 'hist':
+        fig = plot_hist(spec, agg['bins'], agg['counts'])
+    elif spec['kind'] == 'pie':
+        fig = plot_pie(spec, agg['counts'])
+    else:
+        fig = plot_bar(spec, agg['means'], agg['stds'])
+    if fig is None:
+        return []
+    for path, kwargs in outputs:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fig.savefig(path, **kwargs)
+    _pyplot().close(fig)
+    return [path for path, _ in outputs]
+
+def _render_task(task):
+    return render_figure(*task)
+
+def render_all(data, out_dir: str = 'docs', specs: list = None, workers: int = None,
+               force: bool = False, formats: list = ('png',), dpis: list = None,
+               thumb_dpi: int = None, chunksize: int = 1_000_000) -> tuple:
+    """
+    Dibuja las figuras de `specs` (por defecto, todas) cuya clave no coincide
+    con la de la caché. `data` es un DataFrame o la ruta de la tabla de
+    variables, que se recorre por bloques de `chunksize` filas. Con
+    `workers` = 1 se dibuja en serie. Devuelve las rutas (dibujadas,
+    reutilizadas).
+    """
+    specs = FIGURES if specs is None else specs
+    columns = sorted({c for spec in specs for c in figure_columns(spec)})
+    aggs = aggregate_figures(chunk_source(data, columns, chunksize), specs)
+    cache = {} if force else load_cache(out_dir)
+    tasks, keys, cached = [], {}, []
+    for spec in specs:
+        agg = aggs[spec['name']]
+        outputs = figure_outputs(spec, out_dir, formats, dpis, thumb_dpi)
+        key = figure_key(spec, agg, outputs)
+        if cache.get(spec['name']) == key and all(os.path.exists(p) for p, _ in outputs):
+            cached.extend(p for p, _ in outputs)
+            continue
+        keys[spec['name']] = key
+        tasks.append((spec, agg, outputs))
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        rendered = [p for t in tasks for p in _render_task(t)]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            rendered = [p for paths in pool.map(_render_task, tasks) for p in paths]
+    if tasks:
+        # Se relee por si `force` vació la caché: se conservan las claves del resto
+        save_cache(out_dir, {**load_cache(out_dir), **keys})
+    return rendered, cached
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Genera las figuras de docs/')
+    parser.add_argument('--only', default=None,
+                        help='Dibujar sólo estas figuras, separadas por comas (p. ej. imc,presion_arterial)')
+    parser.add_argument('--group', default=None,
+                        help='Dibujar sólo estas categorías, separadas por comas (p. ej. biomedicos)')
+    parser.add_argument('--list', action='store_true',
+                        help='Listar las figuras disponibles por categoría y salir')
+    parser.add_argument('--input', default='variables_generadas.csv',
+                        help='Variables derivadas (CSV o formato columnar: .parquet, .feather, .arrow, .mmap)')
+    parser.add_argument('--output-dir', default='docs',
+                        help='Carpeta raíz: PNG en <carpeta>/png/<categoría>/, SVG/PDF en <carpeta>/<formato>/')
+    parser.add_argument('--formats', default='png',
+                        help=f"Formatos separados por comas ({', '.join(RASTER_FORMATS + VECTOR_FORMATS)})")
+    parser.add_argument('--dpi', default=None,
+                        help='DPI de los PNG, separados por comas (el primero sin sufijo en el nombre)')
+    parser.add_argument('--thumbnails', type=int, nargs='?', const=30, default=None, metavar='DPI',
+                        help='Escribir también miniaturas PNG en <carpeta>/miniaturas/ (por defecto a 30 DPI)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Procesos de dibujo (por defecto, uno por CPU)')
+    parser.add_argument('--force', action='store_true',
+                        help='Redibujar todas las figuras aunque no hayan cambiado')
+    parser.add_argument('--chunksize', type=int, default=1_000_000,
+                        help='Filas por bloque al recorrer los datos')
+    args = parser.parse_args()
+    if args.list:
+        for spec in FIGURES:
+            print(f"{spec['category']:<18}{spec['name']}")
+        raise SystemExit(0)
+    try:
+        specs = select_figures(args.only.split(',') if args.only else None,
+                               args.group.split(',') if args.group else None)
+    except ValueError as e:
+        parser.error(str(e))
+    formats = args.formats.split(',')
+    unknown = set(formats) - set(RASTER_FORMATS + VECTOR_FORMATS)
+    if unknown:
+        parser.error(f"formatos no soportados: {', '.join(sorted(unknown))}")
+    dpis = [int(d) for d in args.dpi.split(',')] if args.dpi else None
+
+    rendered, cached = render_all(args.input, args.output_dir, specs, workers=args.workers,
+                                  force=args.force, formats=formats, dpis=dpis,
+                                  thumb_dpi=args.thumbnails, chunksize=args.chunksize)
+    print(f"Caché: {len(cached)} ficheros reutilizados, {len(rendered)} escritos")
+    for path in rendered:
+        print(f"  escrito {path}")
@@ -0,0 +1,175 @@
+"""
+Ingesta de varias exportaciones (oleadas) de la encuesta.
+
+Las exportaciones se solapan: la misma respuesta ("Marca temporal" y
+contenido) aparece en más de un fichero. Aquí se unen en un único flujo
+ordenado por marca temporal y sin duplicados, que se entrega por bloques a
+`derive_variables`:
+
+1. Índice (en paralelo, un fichero por proceso): de cada fila se guarda
+   sólo su marca temporal, una huella de 128 bits del contenido (dos
+   `hash_pandas_object` con claves distintas) y su IMC. Son 32 bytes por
+   fila, no la fila entera.
+2. Deduplicación: tabla hash sobre (marca, huella), coste lineal; se queda
+   la primera aparición en el orden de los ficheros (ordenados por nombre).
+3. Orden: las filas que quedan se ordenan por marca temporal (a igualdad,
+   por fichero y fila) y cada una recibe su posición en el flujo.
+4. Lectura: cada fichero se vuelve a leer por bloques y se emiten los
+   bloques del flujo en orden. Como cada exportación viene ya en orden
+   cronológico, de cada fichero sólo hay en memoria lo que falta por emitir
+   del bloque en curso.
+"""
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import generador_variables as gv
+from almacenamiento import VariablesWriter
+from esquema_encuesta import read_survey
+from instrumentacion import instrument
+
+# Segunda clave de hash (16 caracteres) para completar la huella de 128 bits
+SECOND_HASH_KEY = 'oleadas-encuesta'
+
+# ——————————————————————
+# Ficheros de entrada
+# ——————————————————————
+def survey_files(source: str) -> list:
+    """Exportaciones de un directorio (*.csv), de un patrón glob o un único fichero."""
+    if os.path.isdir(source):
+        files = sorted(glob.glob(os.path.join(source, '*.csv')))
+    elif glob.has_magic(source):
+        files = sorted(glob.glob(source))
+    else:
+        files = [source] if os.path.exists(source) else []
+    if not files:
+        raise FileNotFoundError(f"No hay exportaciones de la encuesta en {source}")
+    return files
+
+# ——————————————————————
+# Índice de filas
+# ——————————————————————
+def row_keys(chunk: pd.DataFrame) -> tuple:
+    """
+    (marca temporal en ns, huella 1, huella 2) de cada fila. El contenido se
+    normaliza antes de la huella (números a float64, el resto a texto) para
+    que la misma respuesta dé la misma huella aunque pandas infiera tipos
+    distintos en cada exportación.
+    """
+    ts = gv.parse_timestamps(chunk['timestamp'])
+    content = pd.DataFrame({
+        key: (chunk[key].astype('float64') if pd.api.types.is_numeric_dtype(chunk[key])
+              else chunk[key].astype(object))
+        for key in chunk.columns if key != 'timestamp'
+    })
+    content.insert(0, 'timestamp', ts)
+    h1 = pd.util.hash_pandas_object(content, index=False).to_numpy()
+    h2 = pd.util.hash_pandas_object(content, index=False, hash_key=SECOND_HASH_KEY).to_numpy()
+    return ts.to_numpy(dtype='datetime64[ns]').view(np.int64), h1, h2
+
+def index_file(path: str, chunksize: int = 100_000) -> dict:
+    """Índice compacto de una exportación (se ejecuta en un proceso del pool)."""
+    parts = {'ts': [], 'h1': [], 'h2': [], 'bmi': []}
+    for chunk in read_survey(path, chunksize=chunksize):
+        ts, h1, h2 = row_keys(chunk)
+        parts['ts'].append(ts)
+        parts['h1'].append(h1)
+        parts['h2'].append(h2)
+        parts['bmi'].append(gv.bmi_from_measures(gv.parse_measure(chunk['weight']),
+                                                 gv.parse_measure(chunk['height'])))
+    return {k: np.concatenate(v) if v else np.empty(0) for k, v in parts.items()}
+
+def build_index(files: list, workers: int = None, chunksize: int = 100_000) -> dict:
+    """
+    Indexa las exportaciones en paralelo, descarta duplicados y asigna a cada
+    fila que queda su posición en el flujo unificado. Devuelve la posición
+    por fila de cada fichero (-1 si se descarta), los extremos del IMC de
+    las filas que quedan y recuentos.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        indexes = list(pool.map(index_file, files, [chunksize] * len(files)))
+    sizes = [len(ix['ts']) for ix in indexes]
+    ts = np.concatenate([ix['ts'] for ix in indexes]).astype(np.int64)
+    keys = pd.DataFrame({
+        'ts': ts,
+        'h1': np.concatenate([ix['h1'] for ix in indexes]).astype(np.uint64),
+        'h2': np.concatenate([ix['h2'] for ix in indexes]).astype(np.uint64),
+    })
+    # Primera aparición en el orden de los ficheros y de sus filas
+    keep = ~keys.duplicated(keep='first').to_numpy()
+    file_id = np.repeat(np.arange(len(files)), sizes)
+    row = np.concatenate([np.arange(n) for n in sizes]) if sizes else np.empty(0, dtype=int)
+
+    kept = np.flatnonzero(keep)
+    order = kept[np.lexsort((row[kept], file_id[kept], ts[kept]))]
+    rank = np.full(len(ts), -1, dtype=np.int64)
+    rank[order] = np.arange(len(order))
+
+    bmi = np.concatenate([ix['bmi'] for ix in indexes])[keep]
+    finite = bmi[np.isfinite(bmi)]
+    bounds = (float(finite.min()), float(finite.max())) if len(finite) else (np.inf, -np.inf)
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    return {
+        'ranks': [rank[offsets[i]:offsets[i + 1]] for i in range(len(files))],
+        'bmi_bounds': bounds,
+        'rows': int(len(order)),
+        'read': int(len(ts)),
+        'duplicates': int(len(ts) - len(order)),
+    }
+
+# ——————————————————————
+# Flujo unificado
+# ——————————————————————
+def iter_merged(files: list, ranks: list, chunksize: int = 100_000):
+    """
+    Bloques de `chunksize` filas del flujo unificado, en orden, con las
+    columnas de `read_survey` y un índice con la posición en el flujo.
+    """
+    total = sum(int((r >= 0).sum()) for r in ranks)
+    readers = [read_survey(path, chunksize=chunksize) for path in files]
+    consumed = [0] * len(files)
+    buffers = [[] for _ in files]
+    # Mínimo de las posiciones desde cada fila hasta el final del fichero (no
+    # decreciente): las filas a leer para cubrir las posiciones < p son las
+    # que tienen ese mínimo < p. En un fichero ordenado es la propia posición
+    suffix_min = [np.minimum.accumulate(np.where(r >= 0, r, total)[::-1])[::-1] for r in ranks]
+    for end in range(chunksize, total + chunksize, chunksize):
+        end = min(end, total)
+        parts = []
+        for i, reader in enumerate(readers):
+            need = int(np.searchsorted(suffix_min[i], end, side='left'))
+            while consumed[i] < need:
+                chunk = next(reader)
+                chunk.index = ranks[i][consumed[i]:consumed[i] + len(chunk)]
+                consumed[i] += len(chunk)
+                buffers[i].append(chunk[chunk.index >= 0])
+            if buffers[i]:
+                pending = pd.concat(buffers[i]) if len(buffers[i]) > 1 else buffers[i][0]
+                parts.append(pending[pending.index < end])
+                rest = pending[pending.index >= end]
+                buffers[i] = [rest] if len(rest) else []
+        block = pd.concat(parts).sort_index()
+        yield block
+        if end == total:
+            break
+
+def generate_merged(source: str, out_path: str, rngs: dict, chunksize: int = 100_000,
+                    workers: int = None, unknown: dict = None, fmt: str = None) -> dict:
+    """
+    Deriva las variables de todas las exportaciones de `source` (directorio o
+    patrón glob) como si fueran una sola encuesta sin duplicados y ordenada
+    por marca temporal. Devuelve los recuentos de la ingesta.
+    """
+    files = survey_files(source)
+    with instrument.stage('indice_oleadas'):
+        index = build_index(files, workers, chunksize)
+    with VariablesWriter(out_path, fmt) as writer:
+        for chunk in iter_merged(files, index['ranks'], chunksize):
+            out = gv.derive_variables(chunk.reset_index(drop=True), rngs, index['bmi_bounds'], unknown)
+            with instrument.stage('escritura', rows=len(out)):
+                writer.write(out)
+    return {'files': len(files), 'read': index['read'], 'rows': index['rows'],
+            'duplicates': index['duplicates']}
@@ -0,0 +1,242 @@
+"""
+Instrumentación ligera por etapas.
+
+    from instrumentacion import instrument
+
+    with instrument.stage('lectura', rows=len(df)):
+        ...
+
+Desactivada (por defecto) `stage` devuelve un contexto vacío compartido, así
+que el coste es una llamada a función. Activada registra por etapa el tiempo
+real, el tiempo de CPU, el pico de RSS durante la etapa y las filas/segundo;
+las llamadas repetidas a una misma etapa (p. ej. por bloques) se acumulan.
+El pico por etapa necesita reiniciar el máximo del proceso, cosa que sólo
+permite Linux (/proc/self/clear_refs); en otros sistemas queda vacío.
+Opcionalmente ejecuta una etapa concreta bajo cProfile o bajo un perfilador
+de muestreo sencillo.
+"""
+import cProfile
+import io
+import json
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_NULL = nullcontext()
+
+def peak_rss_mb() -> float:
+    """Pico de memoria residente del proceso hasta ahora (MB)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KB y macOS en bytes
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+def reset_peak_rss() -> bool:
+    """Reinicia el pico de RSS del proceso a la RSS actual (sólo Linux). Devuelve si se pudo."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+# ——————————————————————
+# Perfilador de muestreo
+# ——————————————————————
+class SamplingProfiler:
+    """
+    Muestrea cada `interval` segundos la pila del hilo que lo arranca y
+    cuenta las pilas vistas. `collapsed()` devuelve el formato de pilas
+    plegadas que aceptan flamegraph.pl y speedscope.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._target = None
+
+    def start(self):
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return '\n'.join(f"{stack} {n}" for stack, n in self.samples.most_common())
+
+# ——————————————————————
+# Registro de etapas
+# ——————————————————————
+class Instrumentation:
+
+    def __init__(self):
+        self.configure()
+
+    def configure(self, enabled: bool = False, profile_stage: str = None,
+                  profiler: str = 'cprofile', profile_out: str = None):
+        """
+        `profile_stage` ejecuta esa etapa bajo `profiler` ('cprofile' o
+        'sampling') y guarda el resultado en `profile_out` (o lo imprime).
+        """
+        self.enabled = enabled
+        self.profile_stage = profile_stage
+        self.profiler = profiler
+        self.profile_out = profile_out
+        self.stages = {}
+        self._profiler = None
+        # Pico de RSS visto en cada etapa abierta (la última es la más interna)
+        self._peaks = []
+
+    def stage(self, name: str, rows: int = None):
+        if not self.enabled and name != self.profile_stage:
+            return _NULL
+        return self._measure(name, rows)
+
+    @contextmanager
+    def _measure(self, name, rows):
+        profiling = name == self.profile_stage
+        if profiling:
+            self._resume_profiler()
+        if self.enabled:
+            self._start_peak()
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall0
+            cpu = time.process_time() - cpu0
+            if profiling:
+                self._pause_profiler()
+            if self.enabled:
+                peak = self._stop_peak()
+                rec = self.stages.setdefault(name, {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'rows': 0,
+                                                    'peak_rss_mb': None})
+                rec['calls'] += 1
+                rec['wall_s'] += wall
+                rec['cpu_s'] += cpu
+                rec['rows'] += rows or 0
+                if peak is not None:
+                    rec['peak_rss_mb'] = max(rec['peak_rss_mb'] or 0.0, peak)
+
+    # El pico del proceso se reinicia al entrar en cada etapa. Una etapa
+    # anidada lo reinicia también, así que antes se apunta el pico que lleva
+    # la exterior y al salir se le suma el de la interior
+    def _start_peak(self):
+        if self._peaks and self._peaks[-1] is not None:
+            self._peaks[-1] = max(self._peaks[-1], peak_rss_mb())
+        self._peaks.append(0.0 if reset_peak_rss() else None)
+
+    def _stop_peak(self):
+        peak = self._peaks.pop()
+        if peak is not None:
+            peak = max(peak, peak_rss_mb())
+            if self._peaks and self._peaks[-1] is not None:
+                self._peaks[-1] = max(self._peaks[-1], peak)
+        return peak
+
+    # El perfilador se reanuda en cada llamada a la etapa (p. ej. una por
+    # bloque) y acumula todas ellas hasta `dump_profile`
+    def _resume_profiler(self):
+        if self._profiler is None:
+            self._profiler = SamplingProfiler() if self.profiler == 'sampling' else cProfile.Profile()
+        if isinstance(self._profiler, cProfile.Profile):
+            self._profiler.enable()
+        else:
+            self._profiler.start()
+
+    def _pause_profiler(self):
+        if isinstance(self._profiler, cProfile.Profile):
+            self._profiler.disable()
+        else:
+            self._profiler.stop()
+
+    def dump_profile(self) -> None:
+        prof = self._profiler
+        if prof is None:
+            return
+        if isinstance(prof, cProfile.Profile):
+            if self.profile_out:
+                prof.dump_stats(self.profile_out)
+                return
+            out = io.StringIO()
+            pstats.Stats(prof, stream=out).sort_stats('cumulative').print_stats(25)
+            text = out.getvalue()
+        else:
+            text = prof.collapsed()
+            if self.profile_out:
+                with open(self.profile_out, 'w', encoding='utf-8') as f:
+                    f.write(text + '\n')
+                return
+        print(f"— Perfil de la etapa '{self.profile_stage}' —\n{text}")
+
+    def report(self) -> list:
+        """Informe estructurado: una entrada por etapa, en orden de aparición."""
+        out = []
+        for name, rec in self.stages.items():
+            entry = {'stage': name, **rec}
+            entry['rows_per_sec'] = rec['rows'] / rec['wall_s'] if rec['rows'] and rec['wall_s'] > 0 else None
+            out.append(entry)
+        return out
+
+    def print_report(self) -> None:
+        print(f"{'etapa':<24}{'llamadas':>9}{'real (s)':>11}{'CPU (s)':>10}{'pico RSS (MB)':>15}{'filas/s':>14}")
+        for e in self.report():
+            rss = f"{e['peak_rss_mb']:.1f}" if e['peak_rss_mb'] is not None else '-'
+            rps = f"{e['rows_per_sec']:.0f}" if e['rows_per_sec'] else '-'
+            print(f"{e['stage']:<24}{e['calls']:>9}{e['wall_s']:>11.4f}{e['cpu_s']:>10.4f}{rss:>15}{rps:>14}")
+
+    def write_report(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+
+def add_arguments(parser) -> None:
+    """Opciones de línea de comandos comunes a los scripts instrumentados."""
+    parser.add_argument('--instrument', action='store_true',
+                        help='Medir tiempo, CPU, memoria y filas/s por etapa')
+    parser.add_argument('--instrument-json', default=None,
+                        help='Guardar el informe de etapas en este JSON')
+    parser.add_argument('--profile-stage', default=None,
+                        help='Ejecutar esta etapa bajo un perfilador')
+    parser.add_argument('--profiler', choices=['cprofile', 'sampling'], default='cprofile')
+    parser.add_argument('--profile-out', default=None,
+                        help='Fichero de salida del perfil (.prof para cProfile, pilas plegadas para sampling)')
+
+def configure_from_args(args) -> None:
+    instrument.configure(args.instrument or bool(args.instrument_json), args.profile_stage,
+                         args.profiler, args.profile_out)
+
+def finish_from_args(args) -> None:
+    instrument.dump_profile()
+    if instrument.enabled:
+        instrument.print_report()
+        if args.instrument_json:
+            instrument.write_report(args.instrument_json)
+
+# Instancia compartida por los scripts del proyecto
+instrument = Instrumentation()
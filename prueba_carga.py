@@ -0,0 +1,138 @@
+"""
+Prueba de carga del servicio de puntuación (servicio.py).
+
+Sin --url arranca una instancia local en un puerto libre dentro del mismo
+proceso. Cada cliente concurrente mantiene una conexión persistente y envía
+respuestas reales de la encuesta (una por petición a /score o lotes a
+/score/batch). Al final imprime el rendimiento y los percentiles de latencia.
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+from esquema_encuesta import read_survey
+from servicio import FIELDS, make_server
+
+def load_records(path: str) -> list:
+    survey = read_survey(path)[FIELDS]
+    # Categorías como texto y NaN como null, igual que las enviaría un formulario
+    records = survey.astype(object).where(survey.notna(), None).to_dict(orient='records')
+    for r in records:
+        for k, v in r.items():
+            if isinstance(v, (np.integer, np.floating)):
+                r[k] = v.item()
+    return records
+
+def run_client(host: str, port: int, bodies: list, path: str, n_requests: int,
+               latencies: list, errors: list) -> None:
+    conn = http.client.HTTPConnection(host, port)
+    headers = {'Content-Type': 'application/json'}
+    for i in range(n_requests):
+        body = bodies[i % len(bodies)]
+        t0 = time.perf_counter()
+        try:
+            conn.request('POST', path, body, headers)
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status != 200:
+                errors.append(resp.status)
+        except OSError as e:
+            errors.append(str(e))
+            conn.close()
+            conn = http.client.HTTPConnection(host, port)
+            continue
+        latencies.append(time.perf_counter() - t0)
+    conn.close()
+
+def load_test(host: str, port: int, records: list, clients: int = 8, requests: int = 2000,
+              batch_size: int = 0, warmup: int = 50) -> dict:
+    """
+    Lanza `clients` hilos que envían `requests` peticiones en total. Con
+    `batch_size` > 0 cada petición es un lote de ese tamaño a /score/batch.
+    """
+    if batch_size:
+        path = '/score/batch'
+        bodies = [json.dumps({'records': [records[(i + j) % len(records)] for j in range(batch_size)]})
+                  for i in range(0, len(records), batch_size)]
+    else:
+        path = '/score'
+        bodies = [json.dumps(r) for r in records]
+
+    # Calentamiento (tablas, generadores por hilo, conexiones)
+    run_client(host, port, bodies, path, warmup, [], [])
+
+    per_client = [requests // clients + (i < requests % clients) for i in range(clients)]
+    latencies = [[] for _ in range(clients)]
+    errors = []
+    threads = [threading.Thread(target=run_client,
+                                args=(host, port, bodies[i:] + bodies[:i], path, n, latencies[i], errors))
+               for i, n in enumerate(per_client)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    lat = np.concatenate([np.asarray(l) for l in latencies]) * 1000
+    pct = np.percentile(lat, [50, 90, 99]) if len(lat) else [np.nan] * 3
+    return {
+        'path': path,
+        'clients': clients,
+        'requests': int(len(lat)),
+        'errors': len(errors),
+        'batch_size': batch_size or 1,
+        'seconds': elapsed,
+        'requests_per_sec': len(lat) / elapsed if elapsed > 0 else None,
+        'records_per_sec': len(lat) * (batch_size or 1) / elapsed if elapsed > 0 else None,
+        'p50_ms': float(pct[0]),
+        'p90_ms': float(pct[1]),
+        'p99_ms': float(pct[2]),
+        'max_ms': float(lat.max()) if len(lat) else None,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Prueba de carga del servicio de puntuación')
+    parser.add_argument('--url', default=None,
+                        help='Servicio ya arrancado (p. ej. http://127.0.0.1:8000); '
+                             'por defecto se arranca uno local')
+    parser.add_argument('--answers', default='encuesta.csv',
+                        help='Encuesta de la que se toman las respuestas enviadas')
+    parser.add_argument('--clients', type=int, default=8, help='Clientes concurrentes')
+    parser.add_argument('--requests', type=int, default=2000, help='Peticiones en total')
+    parser.add_argument('--batch-size', type=int, default=0,
+                        help='Registros por petición a /score/batch (0 = /score de uno en uno)')
+    parser.add_argument('--output', default=None, help='Guardar el resultado en este JSON')
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        url = urlparse(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        server = make_server(port=0, answers=args.answers, seed=0)
+        host, port = server.server_address[:2]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        result = load_test(host, port, load_records(args.answers), args.clients, args.requests,
+                           args.batch_size)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    print(f"{result['requests']} peticiones a {result['path']} con {result['clients']} clientes "
+          f"en {result['seconds']:.2f} s ({result['requests_per_sec']:.0f} pet/s, "
+          f"{result['records_per_sec']:.0f} registros/s), {result['errors']} errores")
+    print(f"latencia p50 {result['p50_ms']:.2f} ms · p90 {result['p90_ms']:.2f} ms · "
+          f"p99 {result['p99_ms']:.2f} ms · máx {result['max_ms']:.2f} ms")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
@@ -0,0 +1,221 @@
+"""
+Réplicas Monte Carlo de los biomarcadores simulados.
+
+generador_variables.py saca una única realización del ruido de cada
+biomarcador (BP_systolic, LDL, HDL, Glucemia, HR_rest), así que cada
+ejecución da valores distintos. Este modo saca K realizaciones por
+respondiente, como un array filas × K por biomarcador, y las resume sobre
+la marcha:
+
+- por respondiente: media, desviación típica, intervalo de confianza
+  (percentiles centrales al nivel --ci) y las bandas de percentiles pedidas;
+- por población: media poblacional y prevalencia sobre el umbral clínico
+  de cada biomarcador en cada réplica, resumidas con su intervalo.
+
+Las filas se procesan en bloques cuyo tamaño se ajusta a --memory-mb, de
+modo que nunca hay más de un bloque × K muestras en memoria (K=1000 sobre
+un millón de respondientes no pasa de unas decenas de MB). Cada biomarcador
+tiene su propio generador y lo consume en orden de filas, así que el
+resultado depende sólo de la semilla y de K, no del tamaño de bloque.
+
+La salida tiene una fila por respondiente, en el orden de la encuesta (el
+mismo que variables_generadas), con las columnas <biomarcador>_mean,
+_sd, _ci_low, _ci_high y _p<q> de cada banda.
+"""
+import argparse
+import json
+import operator
+
+import numpy as np
+import pandas as pd
+
+import generador_variables as gv
+import instrumentacion
+from almacenamiento import VariablesWriter
+from esquema_encuesta import read_survey
+from instrumentacion import instrument
+
+# ——————————————————————
+# Simuladores y umbrales
+# ——————————————————————
+# Simulador de cada biomarcador y sus entradas deterministas
+SIMULATORS = {
+    'BP_systolic': (gv.simulate_systolic_bp, ['Edad', 'BMI_norm', 'Salt_wk', 'Diet_q', 'Activity_min_wk']),
+    'LDL': (gv.simulate_ldl, ['BMI_norm', 'SatFat_wk', 'Diet_q']),
+    'HDL': (gv.simulate_hdl, ['BMI_norm', 'Activity_min_wk', 'Diet_q']),
+    'Glucemia': (gv.simulate_glucose, ['BMI_norm', 'Sugary_wk', 'Activity_min_wk']),
+    'HR_rest': (gv.simulate_resting_hr, ['HR_base', 'Stress_pct', 'Anxiety_pct', 'Activity_min_wk']),
+}
+
+# Umbral clínico para la prevalencia de cada réplica: (comparación, valor)
+THRESHOLDS = {
+    'BP_systolic': ('>=', 140),    # hipertensión sistólica
+    'LDL': ('>=', 160),            # LDL alto
+    'HDL': ('<', 40),              # HDL bajo
+    'Glucemia': ('>=', 126),       # glucemia en ayunas de diabetes
+    'HR_rest': ('>', 100),         # taquicardia en reposo
+}
+_COMPARE = {'>=': operator.ge, '>': operator.gt, '<': operator.lt, '<=': operator.le}
+
+def summary_quantiles(ci: float = 0.95, bands=()) -> list:
+    """(sufijo de columna, cuantil) del intervalo de confianza y de cada banda."""
+    tail = (1.0 - ci) / 2
+    return [('ci_low', tail), ('ci_high', 1.0 - tail)] + [(f'p{b:g}', b / 100) for b in bands]
+
+def block_rows_for(k: int, memory_mb: float = 64) -> int:
+    """Filas por bloque para que las muestras de un biomarcador quepan en `memory_mb`."""
+    # Muestras, copia para los cuantiles y temporales de la fórmula: ~4 arrays bloque × K
+    return max(1, int(memory_mb * 2 ** 20 // (k * 8 * 4)))
+
+# ——————————————————————
+# Resúmenes
+# ——————————————————————
+class PopulationSummary:
+    """
+    Acumula, para cada una de las K réplicas de un biomarcador, la suma de
+    valores y las filas que superan el umbral. Al final cada réplica da una
+    media poblacional y una prevalencia; su dispersión entre réplicas es la
+    incertidumbre debida al ruido simulado.
+    """
+
+    def __init__(self, k: int, threshold: tuple):
+        self.n = 0
+        self.total = np.zeros(k)
+        self.above = np.zeros(k)
+        self.compare, self.value = _COMPARE[threshold[0]], threshold[1]
+
+    def update(self, draws: np.ndarray) -> None:
+        # Una entrada ausente deja la fila entera a NaN
+        draws = draws[~np.isnan(draws[:, 0])]
+        self.n += len(draws)
+        self.total += draws.sum(axis=0)
+        self.above += self.compare(draws, self.value).sum(axis=0)
+
+    def summary(self, ci: float = 0.95) -> dict:
+        tail = 100 * (1.0 - ci) / 2
+        if self.n == 0:
+            return {'n': 0}
+        out = {'n': self.n}
+        for name, per_replicate in (('mean', self.total / self.n), ('prevalence', self.above / self.n)):
+            lo, hi = np.percentile(per_replicate, [tail, 100 - tail])
+            out[name] = float(per_replicate.mean())
+            out[f'{name}_ci'] = [float(lo), float(hi)]
+        return out
+
+def summarize_draws(draws: np.ndarray, quantiles: list) -> dict:
+    """Resumen por fila de un bloque filas × K."""
+    with np.errstate(invalid='ignore'):
+        q = np.percentile(draws, [100 * p for _, p in quantiles], axis=1)
+        out = {'mean': draws.mean(axis=1), 'sd': draws.std(axis=1, ddof=1)}
+    out.update(zip((suffix for suffix, _ in quantiles), q))
+    return out
+
+def replicate_chunk(derived: pd.DataFrame, rngs: dict, k: int, quantiles: list,
+                    block_rows: int, population: dict = None) -> pd.DataFrame:
+    """
+    Saca K realizaciones de cada biomarcador para las filas de `derived`
+    (salida de `gv.derive_inputs`) por bloques de `block_rows` filas y
+    devuelve su resumen por respondiente. Si se pasa `population`
+    (biomarcador → PopulationSummary) se va acumulando también.
+    """
+    n = len(derived)
+    suffixes = ['mean', 'sd'] + [suffix for suffix, _ in quantiles]
+    out = {f'{bm}_{s}': np.empty(n) for bm in SIMULATORS for s in suffixes}
+    inputs = {bm: [derived[col].to_numpy(dtype=float) for col in cols]
+              for bm, (_, cols) in SIMULATORS.items()}
+    for start in range(0, n, block_rows):
+        rows = slice(start, start + block_rows)
+        for bm, (simulate, _) in SIMULATORS.items():
+            draws = simulate(*(x[rows] for x in inputs[bm]), rng=rngs[bm], replicates=k)
+            for s, values in summarize_draws(draws, quantiles).items():
+                out[f'{bm}_{s}'][rows] = values
+            if population is not None:
+                population[bm].update(draws)
+    return pd.DataFrame(out, index=derived.index)
+
+# ——————————————————————
+# Recorrido de la encuesta
+# ——————————————————————
+def generate_replicates(in_path: str, out_path: str, k: int = 1000, seed=None,
+                        chunksize: int = 100_000, ci: float = 0.95, bands=(5, 50, 95),
+                        memory_mb: float = 64, unknown: dict = None) -> dict:
+    """
+    Lee la encuesta por bloques, deriva las entradas deterministas de los
+    simuladores con `gv.derive_inputs` (IMC normalizado contra los extremos
+    globales, como el modo en streaming) y escribe el resumen de K réplicas
+    por respondiente.
+    Devuelve el resumen poblacional de cada biomarcador.
+    """
+    rngs = gv.make_biomarker_rngs(seed)
+    quantiles = summary_quantiles(ci, bands)
+    block_rows = block_rows_for(k, memory_mb)
+    population = {bm: PopulationSummary(k, THRESHOLDS[bm]) for bm in SIMULATORS}
+
+    with instrument.stage('limites_imc'):
+        bmi_bounds = gv.compute_bmi_bounds(in_path, chunksize)
+    rows = 0
+    with VariablesWriter(out_path) as writer:
+        for chunk in read_survey(in_path, chunksize=chunksize):
+            derived = gv.derive_inputs(chunk, bmi_bounds, unknown)
+            with instrument.stage('replicas', rows=len(derived)):
+                out = replicate_chunk(derived, rngs, k, quantiles, block_rows, population)
+            with instrument.stage('escritura', rows=len(out)):
+                writer.write(out)
+            rows += len(out)
+    return {
+        'rows': rows,
+        'replicates': k,
+        'ci': ci,
+        'block_rows': block_rows,
+        'thresholds': {bm: f'{op} {v}' for bm, (op, v) in THRESHOLDS.items()},
+        'population': {bm: acc.summary(ci) for bm, acc in population.items()},
+    }
+
+def print_report(report: dict) -> None:
+    print(f"{report['rows']} respondientes × {report['replicates']} réplicas "
+          f"(bloques de {report['block_rows']} filas)")
+    level = f"IC {report['ci']:.0%}"
+    for bm, s in report['population'].items():
+        if not s['n']:
+            print(f"  {bm}: sin datos")
+            continue
+        print(f"  {bm}: media {s['mean']:.2f} ({level} {s['mean_ci'][0]:.2f}-{s['mean_ci'][1]:.2f}), "
+              f"{report['thresholds'][bm]}: {s['prevalence']:.2%} "
+              f"({s['prevalence_ci'][0]:.2%}-{s['prevalence_ci'][1]:.2%})")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Réplicas Monte Carlo de los biomarcadores simulados')
+    parser.add_argument('--input', default='encuesta.csv', help='Exportación de la encuesta (CSV con ;)')
+    parser.add_argument('--output', default='variables_replicas.csv',
+                        help='Resumen por respondiente (.csv, .parquet, .feather o .arrow)')
+    parser.add_argument('--replicates', '-k', type=int, default=1000,
+                        help='Realizaciones por respondiente y biomarcador')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--ci', type=float, default=0.95,
+                        help='Nivel del intervalo de confianza por respondiente y poblacional')
+    parser.add_argument('--bands', default='5,50,95',
+                        help='Percentiles por respondiente separados por comas (vacío para ninguno)')
+    parser.add_argument('--chunksize', type=int, default=100_000,
+                        help='Filas de la encuesta leídas por bloque')
+    parser.add_argument('--memory-mb', type=float, default=64,
+                        help='Memoria aproximada para las muestras de un bloque de filas')
+    parser.add_argument('--report', default=None, help='Guardar el resumen poblacional en este JSON')
+    instrumentacion.add_arguments(parser)
+    args = parser.parse_args()
+    if args.replicates < 2:
+        parser.error('--replicates debe ser al menos 2')
+    if not 0 < args.ci < 1:
+        parser.error('--ci debe estar entre 0 y 1')
+    instrumentacion.configure_from_args(args)
+
+    bands = [float(b) for b in args.bands.split(',') if b.strip()]
+    unknown = {}
+    report = generate_replicates(args.input, args.output, args.replicates, args.seed,
+                                 args.chunksize, args.ci, bands, args.memory_mb, unknown)
+    gv.report_unrecognized(unknown)
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    instrumentacion.finish_from_args(args)
@@ -0,0 +1,177 @@
+"""
+Riesgo cardiovascular a 10 años a partir de variables_generadas.
+
+Modelos de riesgo general de enfermedad cardiovascular de Framingham
+(D'Agostino et al., Circulation 2008), en su forma de Cox:
+
+    riesgo = 1 - S0 ** exp(Σ β·x - media)
+
+- framingham: edad, colesterol total, HDL, presión sistólica (tratada o
+  no), tabaquismo y diabetes.
+- framingham_imc: versión sin analítica que sustituye los lípidos por el IMC.
+
+Aproximaciones sobre las variables derivadas:
+- colesterol total ≈ LDL + HDL + 30 (Friedewald con triglicéridos de 150 mg/dL)
+- presión tratada = Hipertension == 1 (diagnóstico declarado)
+- fumador = Tobacco ≥ 0.5 (consumo semanal o más)
+- diabetes = Diabetes == 1
+
+Los modelos se validaron entre 30 y 74 años; fuera de ese rango el riesgo
+se calcula igualmente pero se cuenta aparte en el informe.
+
+Bandas: bajo (<10 %), intermedio (10-20 %) y alto (>20 %). Se procesa por
+bloques, de modo que millones de filas se puntúan con memoria acotada.
+"""
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+from almacenamiento import VariablesWriter, iter_variables
+
+# ——————————————————————
+# Coeficientes
+# ——————————————————————
+# Por sexo: β de cada término, supervivencia basal a 10 años (S0) y media de Σ β·x
+MODELS = {
+    'framingham': {
+        'columns': ('CVD_risk', 'CVD_band'),
+        'female': dict(ln_age=2.32888, ln_tc=1.20904, ln_hdl=-0.70833, ln_sbp=2.76157,
+                       ln_sbp_treated=2.82263, smoker=0.52873, diabetes=0.69154,
+                       s0=0.95012, mean=26.1931),
+        'male': dict(ln_age=3.06117, ln_tc=1.12370, ln_hdl=-0.93263, ln_sbp=1.93303,
+                     ln_sbp_treated=1.99881, smoker=0.65451, diabetes=0.57367,
+                     s0=0.88936, mean=23.9802),
+    },
+    'framingham_imc': {
+        'columns': ('CVD_risk_bmi', 'CVD_band_bmi'),
+        'female': dict(ln_age=2.72107, ln_bmi=0.51125, ln_sbp=2.81291,
+                       ln_sbp_treated=2.88267, smoker=0.61868, diabetes=0.77763,
+                       s0=0.94833, mean=26.0145),
+        'male': dict(ln_age=3.11296, ln_bmi=0.79277, ln_sbp=1.85508,
+                     ln_sbp_treated=1.92672, smoker=0.70953, diabetes=0.53160,
+                     s0=0.88431, mean=23.9388),
+    },
+}
+
+AGE_RANGE = (30, 74)
+# Límites entre bandas (fracción; cada límite pertenece a la banda superior)
+BAND_EDGES = [0.10, 0.20]
+BAND_LABELS = ['bajo', 'intermedio', 'alto']
+
+# ——————————————————————
+# Cálculo vectorizado
+# ——————————————————————
+def risk_factors(df: pd.DataFrame) -> dict:
+    """Logaritmos y factores binarios de los modelos, como arrays."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ldl = df['LDL'].to_numpy(dtype=float)
+        hdl = df['HDL'].to_numpy(dtype=float)
+        return {
+            'male': df['Sexo_num'].to_numpy(dtype=float) == 1,
+            'ln_age': np.log(df['Edad'].to_numpy(dtype=float)),
+            'ln_tc': np.log(ldl + hdl + 30.0),
+            'ln_hdl': np.log(hdl),
+            'ln_bmi': np.log(df['BMI'].to_numpy(dtype=float)),
+            'ln_sbp': np.log(df['BP_systolic'].to_numpy(dtype=float)),
+            'treated': df['Hipertension'].to_numpy(dtype=float) == 1,
+            'smoker': (df['Tobacco'].to_numpy(dtype=float) >= 0.5).astype(float),
+            'diabetes': (df['Diabetes'].to_numpy(dtype=float) == 1).astype(float),
+        }
+
+def _linear_predictor(f: dict, coef: dict) -> np.ndarray:
+    sbp = np.where(f['treated'], coef['ln_sbp_treated'], coef['ln_sbp']) * f['ln_sbp']
+    lp = coef['ln_age'] * f['ln_age'] + sbp + coef['smoker'] * f['smoker'] \
+        + coef['diabetes'] * f['diabetes']
+    for term in ('ln_tc', 'ln_hdl', 'ln_bmi'):
+        if term in coef:
+            lp = lp + coef[term] * f[term]
+    return lp
+
+def model_risk(f: dict, model: dict) -> np.ndarray:
+    """Riesgo a 10 años (fracción 0-1) de un modelo para todas las filas."""
+    risk = np.empty(len(f['male']))
+    for sex, mask in (('male', f['male']), ('female', ~f['male'])):
+        coef = model[sex]
+        lp = _linear_predictor({k: v[mask] for k, v in f.items()}, coef)
+        risk[mask] = 1.0 - coef['s0'] ** np.exp(lp - coef['mean'])
+    return risk
+
+def risk_band(risk: np.ndarray) -> np.ndarray:
+    """Código de banda por fila: 0 bajo, 1 intermedio, 2 alto, -1 sin dato."""
+    band = np.searchsorted(BAND_EDGES, risk, side='right').astype(np.int8)
+    return np.where(np.isnan(risk), np.int8(-1), band)
+
+def add_risk_columns(df: pd.DataFrame, models: list = None) -> pd.DataFrame:
+    """Añade a `df` el riesgo y la banda de cada modelo."""
+    f = risk_factors(df)
+    for name in models or list(MODELS):
+        risk_col, band_col = MODELS[name]['columns']
+        risk = model_risk(f, MODELS[name])
+        df[risk_col] = risk
+        df[band_col] = risk_band(risk)
+    return df
+
+# ——————————————————————
+# Recorrido por bloques
+# ——————————————————————
+def score_file(in_path: str, out_path: str, models: list = None,
+               chunksize: int = 1_000_000) -> dict:
+    """
+    Puntúa la tabla de variables por bloques, escribe la tabla con las
+    columnas de riesgo añadidas y devuelve el recuento por banda de cada
+    modelo (y de filas fuera del rango de edad de validación).
+    """
+    models = models or list(MODELS)
+    counts = {name: np.zeros(len(BAND_LABELS) + 1, dtype=np.int64) for name in models}
+    rows = out_of_range = 0
+    with VariablesWriter(out_path) as writer:
+        for chunk in iter_variables(in_path, chunksize=chunksize):
+            chunk = add_risk_columns(chunk, models)
+            for name in models:
+                # La última posición de bincount recoge el código -1 (sin dato)
+                counts[name] += np.bincount(chunk[MODELS[name]['columns'][1]].to_numpy() % 4,
+                                            minlength=4)
+            age = chunk['Edad'].to_numpy(dtype=float)
+            out_of_range += int(np.count_nonzero((age < AGE_RANGE[0]) | (age > AGE_RANGE[1])))
+            rows += len(chunk)
+            writer.write(chunk)
+    return {
+        'rows': rows,
+        'out_of_age_range': out_of_range,
+        'bands': {name: {**dict(zip(BAND_LABELS, c[:3].tolist())), 'sin dato': int(c[3])}
+                  for name, c in counts.items()},
+    }
+
+def print_report(report: dict) -> None:
+    rows = report['rows']
+    print(f"{rows} filas puntuadas ({report['out_of_age_range']} fuera de "
+          f"{AGE_RANGE[0]}-{AGE_RANGE[1]} años)")
+    for name, bands in report['bands'].items():
+        parts = [f"{label} {n} ({n / rows:.1%})" if rows else f"{label} {n}"
+                 for label, n in bands.items()]
+        print(f"  {name}: " + ', '.join(parts))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Riesgo cardiovascular a 10 años (Framingham)')
+    parser.add_argument('--input', default='variables_generadas.csv',
+                        help='Variables derivadas (CSV o formato columnar)')
+    parser.add_argument('--output', default='variables_riesgo.csv',
+                        help='Tabla de salida con las columnas de riesgo añadidas')
+    parser.add_argument('--models', default=','.join(MODELS),
+                        help=f"Modelos separados por comas ({', '.join(MODELS)})")
+    parser.add_argument('--chunksize', type=int, default=1_000_000)
+    parser.add_argument('--report', default=None, help='Guardar el recuento por bandas en este JSON')
+    args = parser.parse_args()
+
+    models = args.models.split(',')
+    unknown = [m for m in models if m not in MODELS]
+    if unknown:
+        parser.error(f"modelos desconocidos: {', '.join(unknown)}")
+    report = score_file(args.input, args.output, models, args.chunksize)
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
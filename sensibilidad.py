@@ -0,0 +1,208 @@
+"""
+Sensibilidad de los índices compuestos a sus pesos.
+
+Diet_q y Harmful_habits son combinaciones lineales de componentes de la
+encuesta con pesos fijos (`gv.DIET_Q_WEIGHTS`, `gv.HARMFUL_WEIGHTS`):
+
+    Diet_q         = w_self·auto-evaluación + Σ w_i·(1 - frecuencia_i / 7)
+                     (sal, azúcar, grasas saturadas, alcohol; por defecto
+                     0.3 y 0.7/4 para cada consumo)
+    Harmful_habits = w_t·tabaco + w_v·vapeo + w_d·estupefacientes
+
+Se barren miles de vectores de pesos a la vez: los componentes se apilan en
+una matriz filas × componentes, se multiplican por la matriz componentes ×
+configuraciones y de cada columna del resultado se sacan la media, la
+desviación típica, percentiles y la proporción de población que cruza el
+umbral del índice.
+
+Los componentes salen de respuestas categóricas, así que toman pocos
+valores: la población se reduce primero a sus combinaciones distintas con
+su recuento (recorriendo la encuesta por bloques) y las estadísticas se
+calculan ponderadas sobre ellas. El coste depende del número de
+combinaciones distintas, no del de respondientes.
+"""
+import argparse
+import itertools
+import operator
+import os
+
+import numpy as np
+import pandas as pd
+
+import generador_variables as gv
+from esquema_encuesta import read_survey
+
+# ——————————————————————
+# Índices y componentes
+# ——————————————————————
+def diet_components(survey: pd.DataFrame) -> np.ndarray:
+    """Auto-evaluación y término saludable (1 - frecuencia/7) de cada consumo."""
+    cols = [gv.map_categories(survey['diet_self'], gv.map_diet_quality).to_numpy()]
+    for key in ('salt', 'sugary', 'satfat', 'alcohol'):
+        freq = gv.map_categories(survey[key], gv.map_weekly_freq).to_numpy()
+        cols.append(1 - np.clip(freq / 7.0, 0, 1))
+    return np.column_stack(cols)
+
+def harmful_components(survey: pd.DataFrame) -> np.ndarray:
+    return np.column_stack([gv.map_categories(survey[key], gv.map_tobacco_consumption).to_numpy()
+                            for key in ('tobacco', 'vaping', 'drugs')])
+
+INDEXES = {
+    'Diet_q': {
+        'keys': ['diet_self', 'salt', 'sugary', 'satfat', 'alcohol'],
+        'components': ['self', 'salt', 'sugary', 'satfat', 'alcohol'],
+        'extract': diet_components,
+        'default': (gv.DIET_Q_WEIGHTS[0],) + (gv.DIET_Q_WEIGHTS[1] / 4,) * 4,
+        'step': 0.05,
+        'threshold': ('<', 0.5),        # dieta pobre
+    },
+    'Harmful_habits': {
+        'keys': ['tobacco', 'vaping', 'drugs'],
+        'components': ['tobacco', 'vaping', 'drugs'],
+        'extract': harmful_components,
+        'default': gv.HARMFUL_WEIGHTS,
+        'step': 0.01,
+        'threshold': ('>=', 0.5),       # consumo nocivo al menos ocasional
+    },
+}
+_COMPARE = {'>=': operator.ge, '>': operator.gt, '<': operator.lt, '<=': operator.le}
+
+PERCENTILES = (10, 25, 50, 75, 90)
+
+# ——————————————————————
+# Matrices de pesos
+# ——————————————————————
+def simplex_grid(dim: int, step: float) -> np.ndarray:
+    """Todos los vectores de `dim` pesos no negativos múltiplos de `step` que suman 1."""
+    k = int(round(1 / step))
+    # Separadores de "estrellas y barras": cada combinación es un reparto de k pasos
+    cuts = np.array(list(itertools.combinations(range(k + dim - 1), dim - 1)), dtype=int)
+    cuts = cuts.reshape(len(cuts), dim - 1)
+    edges = np.hstack([np.full((len(cuts), 1), -1), cuts, np.full((len(cuts), 1), k + dim - 1)])
+    return (np.diff(edges, axis=1) - 1) / k
+
+def weight_matrix(index: str, step: float = None, weights: pd.DataFrame = None) -> np.ndarray:
+    """
+    Configuraciones × componentes: los pesos por defecto en la primera fila
+    y después la rejilla del símplex (o las filas de `weights`).
+    """
+    spec = INDEXES[index]
+    if weights is not None:
+        grid = weights[spec['components']].to_numpy(dtype=float)
+    else:
+        grid = simplex_grid(len(spec['components']), step or spec['step'])
+    return np.vstack([np.asarray(spec['default'], dtype=float), grid])
+
+# ——————————————————————
+# Población reducida
+# ——————————————————————
+def component_counts(path: str, chunksize: int = 100_000) -> dict:
+    """
+    Recorre la encuesta por bloques y devuelve, para cada índice, las
+    combinaciones distintas de componentes (matriz) y su recuento.
+    """
+    keys = sorted({k for spec in INDEXES.values() for k in spec['keys']})
+    counts = {name: None for name in INDEXES}
+    for chunk in read_survey(path, keys=keys, chunksize=chunksize):
+        for name, spec in INDEXES.items():
+            block = pd.DataFrame(spec['extract'](chunk)).value_counts(dropna=False)
+            counts[name] = block if counts[name] is None else counts[name].add(block, fill_value=0)
+    out = {}
+    for name, vc in counts.items():
+        if vc is None:
+            out[name] = (np.empty((0, len(INDEXES[name]['components']))), np.empty(0))
+        else:
+            out[name] = (np.array(vc.index.to_list(), dtype=float), vc.to_numpy(dtype=float))
+    return out
+
+def _weighted_percentiles(values: np.ndarray, counts: np.ndarray, qs) -> np.ndarray:
+    # Menor valor cuya frecuencia acumulada alcanza q·N (np.percentile con
+    # method='inverted_cdf' sobre la población expandida), por columna
+    order = np.argsort(values, axis=0)
+    sorted_vals = np.take_along_axis(values, order, axis=0)
+    cum = np.cumsum(counts[order], axis=0)
+    total = cum[-1]
+    out = np.empty((len(qs), values.shape[1]))
+    for i, q in enumerate(qs):
+        pos = np.argmax(cum >= q / 100 * total, axis=0)
+        out[i] = sorted_vals[pos, np.arange(values.shape[1])]
+    return out
+
+def sweep(components: np.ndarray, counts: np.ndarray, weights: np.ndarray,
+          threshold: tuple, block: int = 512) -> pd.DataFrame:
+    """
+    Estadísticas del índice ponderado para cada fila de `weights`, sobre la
+    población dada por `components` (combinaciones distintas) y `counts`.
+    Se procesa por bloques de `block` configuraciones.
+    """
+    valid = ~np.isnan(components).any(axis=1)
+    x, c = components[valid], counts[valid]
+    n = c.sum()
+    compare, limit = _COMPARE[threshold[0]], threshold[1]
+    stats = {s: np.full(len(weights), np.nan)
+             for s in ['mean', 'sd'] + [f'p{q}' for q in PERCENTILES] + ['share']}
+    if n == 0:
+        return pd.DataFrame(stats)
+    for start in range(0, len(weights), block):
+        cfg = slice(start, start + block)
+        # Combinaciones × configuraciones; los índices se recortan a [0, 1] como en gv
+        values = np.clip(x @ weights[cfg].T, 0, 1)
+        mean = c @ values / n
+        stats['mean'][cfg] = mean
+        stats['sd'][cfg] = np.sqrt(c @ (values - mean) ** 2 / max(n - 1, 1))
+        for q, row in zip(PERCENTILES, _weighted_percentiles(values, c, PERCENTILES)):
+            stats[f'p{q}'][cfg] = row
+        stats['share'][cfg] = c @ compare(values, limit) / n
+    return pd.DataFrame(stats)
+
+def sweep_index(index: str, components: np.ndarray, counts: np.ndarray,
+                step: float = None, weights: pd.DataFrame = None) -> pd.DataFrame:
+    """Tabla de resultados: pesos, marca de la configuración por defecto y estadísticas."""
+    spec = INDEXES[index]
+    w = weight_matrix(index, step, weights)
+    table = pd.DataFrame(w, columns=[f"w_{c}" for c in spec['components']])
+    table.insert(0, 'default', np.arange(len(w)) == 0)
+    return pd.concat([table, sweep(components, counts, w, spec['threshold'])], axis=1)
+
+def print_summary(index: str, table: pd.DataFrame, n: int) -> None:
+    spec = INDEXES[index]
+    op, limit = spec['threshold']
+    default = table.iloc[0]
+    rest = table.iloc[1:]
+    print(f"{index}: {len(rest)} configuraciones sobre {n} respondientes")
+    print(f"  por defecto: media {default['mean']:.3f}, {op} {limit}: {default['share']:.1%}")
+    if len(rest) and rest['mean'].notna().any():
+        weight_cols = [f"w_{c}" for c in spec['components']]
+        for stat, label, fmt in (('mean', 'media', '.3f'), ('share', f'{op} {limit}', '.1%')):
+            lo, hi = rest[stat].idxmin(), rest[stat].idxmax()
+            print(f"  {label}: {rest.at[lo, stat]:{fmt}} "
+                  f"({', '.join(f'{w:g}' for w in rest.loc[lo, weight_cols])}) - "
+                  f"{rest.at[hi, stat]:{fmt}} ({', '.join(f'{w:g}' for w in rest.loc[hi, weight_cols])})")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Barrido de los pesos de Diet_q y Harmful_habits')
+    parser.add_argument('--input', default='encuesta.csv', help='Exportación de la encuesta (CSV con ;)')
+    parser.add_argument('--output', default='sensibilidad.csv',
+                        help='Base de los CSV de salida (uno por índice: <base>_<índice>.csv)')
+    parser.add_argument('--index', choices=list(INDEXES), action='append', default=None,
+                        help='Índice a barrer (repetible; por defecto todos)')
+    parser.add_argument('--step', type=float, default=None,
+                        help='Paso de la rejilla de pesos (por defecto '
+                             + ', '.join(f"{k} {v['step']:g}" for k, v in INDEXES.items()) + ')')
+    parser.add_argument('--weights', default=None,
+                        help='CSV con vectores de pesos propios (columnas = componentes del índice)')
+    parser.add_argument('--chunksize', type=int, default=100_000)
+    args = parser.parse_args()
+    indexes = args.index or list(INDEXES)
+    if args.weights and len(indexes) != 1:
+        parser.error('--weights requiere un único --index')
+
+    weights = pd.read_csv(args.weights) if args.weights else None
+    populations = component_counts(args.input, args.chunksize)
+    base, ext = os.path.splitext(args.output)
+    for index in indexes:
+        components, counts = populations[index]
+        table = sweep_index(index, components, counts, args.step, weights)
+        table.to_csv(f'{base}_{index}{ext or ".csv"}', index=False)
+        print_summary(index, table, int(counts.sum()))
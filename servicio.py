@@ -0,0 +1,258 @@
+"""
+Servicio HTTP local que puntúa respuestas sueltas de la encuesta con la
+misma lógica que generador_variables.py.
+
+    POST /score        un objeto JSON con las claves del registro de
+                       esquema_encuesta (age, sex, weight, height, ...)
+    POST /score/batch  {"records": [...]}, puntuados juntos sobre arrays
+    GET  /health
+
+Las respuestas categóricas se traducen con tablas precompiladas al
+arrancar (cada respuesta distinta de la encuesta de referencia pasada una
+vez por su mapper); una respuesta nueva se evalúa con el mapper en cada
+petición sin guardarla, para que la entrada de los clientes no haga crecer
+las tablas. El IMC se normaliza contra extremos fijos (los de la encuesta de
+referencia o los del fichero de estado del modo incremental), de modo que
+la puntuación de un respondiente no depende de los demás.
+"""
+import argparse
+import json
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+import generador_variables as gv
+from esquema_encuesta import SURVEY_SCHEMA, read_survey
+
+# Claves del registro que usa la puntuación (todas menos la marca temporal)
+FIELDS = [k for k in SURVEY_SCHEMA if k != 'timestamp']
+
+# ——————————————————————
+# Tablas de consulta
+# ——————————————————————
+class LookupTables:
+    """Respuesta → valor para cada pregunta categórica de `gv.FIELD_MAPPERS`."""
+
+    def __init__(self, answers: pd.DataFrame = None):
+        self.tables = {}
+        for field, mapper in gv.FIELD_MAPPERS.items():
+            known = [] if answers is None else answers[field].dropna().unique()
+            self.tables[field] = {str(a): mapper(str(a)) for a in known}
+        # Valor de una respuesta vacía
+        self.missing = {field: mapper(np.nan) for field, mapper in gv.FIELD_MAPPERS.items()}
+
+    def lookup(self, field: str, answer) -> float:
+        if answer is None or answer == '':
+            return self.missing[field]
+        value = self.tables[field].get(answer)
+        if value is None:
+            # Respuesta no vista: se evalúa sin guardarla (las tablas no crecen)
+            value = gv.FIELD_MAPPERS[field](str(answer))
+        return value
+
+# ——————————————————————
+# Puntuación
+# ——————————————————————
+def parse_measure_value(value) -> float:
+    """Versión escalar de `gv.parse_measure`."""
+    if value is None:
+        return math.nan
+    text = str(value).replace(',', '.')
+    return math.nan if text in ('-', '') else float(text)
+
+def _float(value) -> float:
+    return math.nan if value is None else float(value)
+
+class Scorer:
+    """
+    Estado compartido del servicio: tablas, extremos del IMC y un juego de
+    generadores por hilo (numpy.random.Generator no admite uso concurrente).
+    """
+
+    def __init__(self, tables: LookupTables, bmi_bounds: tuple, seed=None):
+        self.tables = tables
+        self.bmi_bounds = bmi_bounds
+        self._seed = np.random.SeedSequence(seed)
+        self._seed_lock = threading.Lock()
+        self._local = threading.local()
+
+    def rngs(self) -> dict:
+        rngs = getattr(self._local, 'rngs', None)
+        if rngs is None:
+            with self._seed_lock:
+                child = self._seed.spawn(1)[0]
+            rngs = self._local.rngs = gv.make_biomarker_rngs(child)
+        return rngs
+
+    def score(self, record: dict) -> dict:
+        """Variables derivadas de un respondiente."""
+        return self.score_batch([record])[0]
+
+    def score_batch(self, records: list) -> list:
+        """
+        Variables derivadas de un lote de respondientes: las respuestas se
+        traducen con las tablas y el resto del cálculo (mismas fórmulas que
+        `gv.derive_variables`) se hace sobre arrays, una vez por lote.
+        """
+        if not records:
+            return []
+        look, rngs = self.tables.lookup, self.rngs()
+        answers = {f: [r.get(f) for r in records] for f in FIELDS}
+        m = {f: np.array([look(f, a) for a in answers[f]]) for f in gv.FIELD_MAPPERS}
+        age = np.array([_float(a) for a in answers['age']])
+        stress = np.array([_float(a) for a in answers['stress']]) * 10.0
+        anxiety = np.array([_float(a) for a in answers['anxiety']]) * 10.0
+        activity = m['activity'] * 30.0
+        diet_q = gv.diet_quality_index(m['diet_self'], m['salt'], m['sugary'], m['satfat'],
+                                       m['alcohol'])
+
+        bmi = gv.bmi_from_measures([parse_measure_value(a) for a in answers['weight']],
+                                   [parse_measure_value(a) for a in answers['height']])
+        mi, ma = self.bmi_bounds
+        bmi_norm = (bmi - mi) / (ma - mi)
+        glucose = gv.simulate_glucose(bmi_norm, m['sugary'], activity, rngs['Glucemia'])
+        out = {
+            'Edad': age,
+            'Sexo_num': np.array([a == 'Masculino' for a in answers['sex']], dtype=int),
+            'Diabetes': m['diabetes'],
+            'Hipertension': m['hypertension'],
+            'BMI': bmi,
+            'BMI_norm': bmi_norm,
+            'BP_systolic': gv.simulate_systolic_bp(age, bmi_norm, m['salt'], diet_q, activity,
+                                                   rngs['BP_systolic']),
+            'LDL': gv.simulate_ldl(bmi_norm, m['satfat'], diet_q, rngs['LDL']),
+            'HDL': gv.simulate_hdl(bmi_norm, activity, diet_q, rngs['HDL']),
+            'Glucemia': glucose,
+            'Blood_sugar': glucose,
+            'HR_rest': gv.simulate_resting_hr(m['heart_rate'], stress, anxiety, activity,
+                                              rngs['HR_rest']),
+            'FamHyper': m['fam_hypertension'],
+            'FamInfarct': m['fam_infarct'],
+            'Stress_pct': stress,
+            'Anxiety_pct': anxiety,
+            'Activity_min_wk': activity,
+            'Alcohol_wk': m['alcohol'],
+            'Diet_q': diet_q,
+            'SatFat_wk': m['satfat'],
+            'Sugary_wk': m['sugary'],
+            'Salt_wk': m['salt'],
+            'Harmful_habits': gv.harmful_habits_index(m['tobacco'], m['vaping'], m['drugs']),
+            'Tobacco': m['tobacco'],
+            'Vaping': m['vaping'],
+            'Drugs': m['drugs'],
+        }
+        columns = [out[col].tolist() for col in gv.OUTPUT_COLUMNS]
+        return [dict(zip(gv.OUTPUT_COLUMNS, values)) for values in zip(*columns)]
+
+def _json_value(v):
+    if isinstance(v, int):
+        return v
+    # NaN no es JSON válido: se envía como null
+    v = float(v)
+    return None if math.isnan(v) else v
+
+def to_json(scored: dict) -> dict:
+    return {k: _json_value(v) for k, v in scored.items()}
+
+# ——————————————————————
+# Servidor HTTP
+# ——————————————————————
+class ScoringHandler(BaseHTTPRequestHandler):
+    # Conexiones persistentes: el cliente no paga un handshake TCP por petición
+    protocol_version = 'HTTP/1.1'
+    # Cabeceras y cuerpo salen en escrituras separadas: sin TCP_NODELAY, Nagle
+    # y el ACK retardado añaden ~40 ms a cada respuesta
+    disable_nagle_algorithm = True
+    scorer: Scorer = None
+    quiet = True
+
+    def _send(self, status: int, payload) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send(200, {'status': 'ok'})
+        else:
+            self._send(404, {'error': f'Ruta desconocida: {self.path}'})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            if length < 0:
+                raise ValueError('Content-Length no válido')
+            payload = json.loads(self.rfile.read(length) or b'null')
+            if self.path == '/score':
+                if not isinstance(payload, dict):
+                    raise ValueError('Se esperaba un objeto JSON con las respuestas')
+                self._send(200, to_json(self.scorer.score(payload)))
+            elif self.path == '/score/batch':
+                records = payload.get('records') if isinstance(payload, dict) else None
+                if not isinstance(records, list):
+                    raise ValueError('Se esperaba {"records": [...]}')
+                if not all(isinstance(r, dict) for r in records):
+                    raise ValueError('Cada elemento de "records" debe ser un objeto JSON con las respuestas')
+                self._send(200, {'results': [to_json(r) for r in self.scorer.score_batch(records)]})
+            else:
+                self._send(404, {'error': f'Ruta desconocida: {self.path}'})
+        except (ValueError, TypeError, KeyError) as e:
+            self._send(400, {'error': str(e)})
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+def bmi_bounds_from_survey(path: str) -> tuple:
+    survey = read_survey(path, keys=['weight', 'height'])
+    bmi = gv.bmi_from_measures(gv.parse_measure(survey['weight']),
+                               gv.parse_measure(survey['height']))
+    return float(np.nanmin(bmi)), float(np.nanmax(bmi))
+
+def make_server(host: str = '127.0.0.1', port: int = 8000, answers: str = 'encuesta.csv',
+                state: str = None, seed=None, quiet: bool = True) -> ThreadingHTTPServer:
+    """
+    Prepara el servidor: tablas a partir de la encuesta `answers` y extremos
+    del IMC del fichero de estado `state` (modo incremental) o, si no se da,
+    de la propia encuesta.
+    """
+    tables = LookupTables(read_survey(answers))
+    if state:
+        st = gv.load_state(state)
+        bounds = (st['bmi_min'], st['bmi_max'])
+    else:
+        bounds = bmi_bounds_from_survey(answers)
+    handler = type('Handler', (ScoringHandler,),
+                   {'scorer': Scorer(tables, bounds, seed), 'quiet': quiet})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Servicio HTTP de puntuación de respuestas')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--answers', default='encuesta.csv',
+                        help='Encuesta de referencia para las tablas y los extremos del IMC')
+    parser.add_argument('--state', default=None,
+                        help='Fichero de estado del modo incremental del que tomar los extremos del IMC')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--verbose', action='store_true', help='Registrar cada petición')
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.answers, args.state, args.seed,
+                         quiet=not args.verbose)
+    print(f"Servicio de puntuación en http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,165 @@
+"""
+Generador de encuestas sintéticas para pruebas de escala.
+
+Ajusta la distribución conjunta de las respuestas de encuesta.csv y escribe
+en streaming una exportación del tamaño pedido con el mismo formato
+(mismas cabeceras, separador ';', UTF-8 con BOM y "Marca temporal"
+creciente), apta como entrada de generador_variables.py.
+
+Métodos:
+- bootstrap: remuestrea filas completas con reemplazo (conserva exactamente
+  la distribución conjunta observada).
+- copula: cópula gaussiana sobre los códigos de categoría de cada columna;
+  conserva las marginales y la correlación entre códigos, y produce
+  combinaciones de respuestas que no aparecen en la muestra original.
+"""
+import argparse
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr, ndtri
+
+from esquema_encuesta import SURVEY_READ_KW
+
+TIMESTAMP_COL = 'Marca temporal'
+TIMESTAMP_FORMAT = '%d/%m/%Y %H:%M'
+
+# ——————————————————————
+# Ajuste
+# ——————————————————————
+def load_answers(path: str) -> pd.DataFrame:
+    """Lee la encuesta como texto tal cual, para poder reescribirla sin cambios de formato."""
+    df = pd.read_csv(path, dtype=str, keep_default_na=False, **SURVEY_READ_KW)
+    return df.astype('category')
+
+def _sort_key(value: str):
+    # Las columnas numéricas (edad, peso, escalas 0-10) se ordenan por valor
+    try:
+        return (0, float(value.replace(',', '.')), value)
+    except ValueError:
+        return (1, 0.0, value)
+
+def fit_copula(answers: pd.DataFrame) -> dict:
+    """
+    Ajusta la cópula gaussiana: para cada columna, categorías ordenadas y su
+    probabilidad acumulada; y la matriz de correlación de las puntuaciones
+    normales de los códigos.
+    """
+    columns = [c for c in answers.columns if c != TIMESTAMP_COL]
+    categories, cumprobs, scores = [], [], []
+    for col in columns:
+        cats = sorted(answers[col].cat.categories, key=_sort_key)
+        codes = pd.Categorical(answers[col], categories=cats).codes
+        probs = np.bincount(codes, minlength=len(cats)) / len(codes)
+        cum = np.cumsum(probs)
+        # Puntuación normal del punto medio del escalón de cada categoría
+        mid = np.clip(cum - probs / 2, 1e-6, 1 - 1e-6)
+        categories.append(np.asarray(cats, dtype=object))
+        cumprobs.append(cum)
+        scores.append(ndtri(mid)[codes])
+    corr = np.atleast_2d(np.corrcoef(np.vstack(scores)))
+    corr = np.nan_to_num(corr)
+    np.fill_diagonal(corr, 1.0)
+    # Proyección a semidefinida positiva para poder factorizar
+    w, v = np.linalg.eigh(corr)
+    corr = (v * np.clip(w, 1e-9, None)) @ v.T
+    d = np.sqrt(np.diag(corr))
+    corr = corr / np.outer(d, d)
+    return {
+        'columns': columns,
+        'categories': categories,
+        'cumprobs': cumprobs,
+        'chol': np.linalg.cholesky(corr),
+    }
+
+# ——————————————————————
+# Muestreo por bloques
+# ——————————————————————
+# Las filas se componen como texto a partir de campos ya formateados en CSV:
+# así el coste por fila es un par de concatenaciones, no un to_csv completo
+SEP = SURVEY_READ_KW['sep']
+
+def _csv_field(value: str) -> str:
+    if any(ch in value for ch in (SEP, '"', '\n', '\r')):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+def _render(values) -> np.ndarray:
+    return np.array([_csv_field(str(v)) for v in values], dtype=object)
+
+def _timestamps(start: pd.Timestamp, first: int, n: int, step_seconds: float) -> np.ndarray:
+    """Marcas dd/mm/aaaa HH:MM crecientes, formateadas por tablas de días y minutos."""
+    start = start.floor('min')
+    minutes = (np.arange(first, first + n) * step_seconds // 60).astype(np.int64)
+    day, minute = np.divmod(minutes + start.hour * 60 + start.minute, 1440)
+    first_day = int(day[0]) if n else 0
+    days = pd.date_range(start.normalize() + pd.Timedelta(days=first_day),
+                         periods=int(day[-1]) - first_day + 1 if n else 0, freq='D')
+    day_str = np.array(days.strftime('%d/%m/%Y'), dtype=object)
+    hm_str = np.array([f'{h:02d}:{m:02d}' for h in range(24) for m in range(60)], dtype=object)
+    return day_str[day - first_day] + ' ' + hm_str[minute]
+
+def _copula_codes(model: dict, rng: np.random.Generator, n: int) -> list:
+    z = rng.standard_normal((n, len(model['columns']))) @ model['chol'].T
+    u = ndtr(z)
+    codes = []
+    for j, cum in enumerate(model['cumprobs']):
+        codes.append(np.minimum(np.searchsorted(cum, u[:, j], side='right'), len(cum) - 1))
+    return codes
+
+def synthetic_lines(answers: pd.DataFrame, n_rows: int, seed=None, chunk_rows: int = 100_000,
+                    method: str = 'bootstrap', step_seconds: float = 60.0):
+    """
+    Genera la encuesta sintética como bloques de líneas CSV (sin cabecera)
+    de como mucho `chunk_rows` filas.
+    """
+    rng = np.random.default_rng(seed)
+    others = [c for c in answers.columns if c != TIMESTAMP_COL]
+    if answers.columns[0] != TIMESTAMP_COL:
+        raise ValueError(f"La primera columna de la encuesta debe ser '{TIMESTAMP_COL}'")
+    start = pd.to_datetime(answers[TIMESTAMP_COL].astype(str), dayfirst=True,
+                           format=TIMESTAMP_FORMAT).min()
+    if method == 'copula':
+        model = fit_copula(answers)
+        fields = [SEP + _render(cats) for cats in model['categories']]
+    else:
+        # Resto de cada fila original ya formateado: el bootstrap sólo elige índices
+        rest = answers[others].apply(_render)
+        rows = np.array([''.join(SEP + v for v in r) for r in rest.itertuples(index=False)],
+                        dtype=object)
+    for first in range(0, n_rows, chunk_rows):
+        n = min(chunk_rows, n_rows - first)
+        lines = _timestamps(start, first, n, step_seconds)
+        if method == 'copula':
+            for field, codes in zip(fields, _copula_codes(model, rng, n)):
+                lines = lines + field[codes]
+        else:
+            lines = lines + rows[rng.integers(0, len(rows), size=n)]
+        yield lines
+
+def write_synthetic(in_path: str, out_path: str, n_rows: int, seed=None,
+                    chunk_rows: int = 100_000, method: str = 'bootstrap',
+                    step_seconds: float = 60.0) -> None:
+    answers = load_answers(in_path)
+    # Un único manejador: el BOM de utf-8-sig sólo se escribe al principio
+    with open(out_path, 'w', encoding=SURVEY_READ_KW['encoding'], newline='') as f:
+        f.write(SEP.join(_csv_field(c) for c in answers.columns) + '\n')
+        for lines in synthetic_lines(answers, n_rows, seed, chunk_rows, method, step_seconds):
+            f.write('\n'.join(lines))
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Genera una exportación sintética de la encuesta')
+    parser.add_argument('--rows', type=int, required=True, help='Número de respuestas a generar')
+    parser.add_argument('--input', default='encuesta.csv', help='Encuesta real sobre la que se ajusta')
+    parser.add_argument('--output', default='encuesta_sintetica.csv')
+    parser.add_argument('--method', choices=['bootstrap', 'copula'], default='bootstrap')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--chunk-rows', type=int, default=100_000,
+                        help='Filas por bloque escrito (acota la memoria)')
+    parser.add_argument('--step-seconds', type=float, default=60.0,
+                        help='Separación entre marcas temporales consecutivas')
+    args = parser.parse_args()
+    write_synthetic(args.input, args.output, args.rows, args.seed, args.chunk_rows,
+                    args.method, args.step_seconds)
+    print(f"Encuesta sintética de {args.rows} filas escrita en {args.output}")